@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 
@@ -162,3 +163,98 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'voters:login'
 LOGIN_REDIRECT_URL = 'voters:dashboard'
+
+
+# Dashboard status updates. The page polls voters:document_status (cheap,
+# ETag-validated); with STATUS_STREAM_ENABLED it opens a server-sent events
+# stream instead. Each open stream holds a worker, so only enable it behind
+# async/threaded workers.
+STATUS_POLL_INTERVAL = int(os.environ.get("STATUS_POLL_INTERVAL", "5"))
+STATUS_STREAM_ENABLED = os.environ.get("STATUS_STREAM_ENABLED", "0") == "1"
+STATUS_STREAM_INTERVAL = float(os.environ.get("STATUS_STREAM_INTERVAL", "2"))
+STATUS_STREAM_MAX_SECONDS = float(os.environ.get("STATUS_STREAM_MAX_SECONDS", "300"))
+
+
+# OCR
+# When OCR_SERVER_SOCKET is set, web workers hand OCR to `manage.py run_ocr_server`
+# over that Unix socket instead of loading EasyOCR in every process.
+
+OCR_SERVER_SOCKET = os.environ.get("OCR_SERVER_SOCKET", "")
+OCR_SERVER_WORKERS = int(os.environ.get("OCR_SERVER_WORKERS", "2"))
+OCR_SERVER_TIMEOUT = float(os.environ.get("OCR_SERVER_TIMEOUT", "120"))
+# The OCR stack is imported on first use; set this to load it when a WSGI
+# worker boots instead (ignored when OCR runs in the OCR server).
+OCR_WARM_UP = os.environ.get("OCR_WARM_UP", "0") == "1"
+# Dynamic int8 quantization of the recogniser (EasyOCR's CPU default) and
+# per-process torch thread pools; 0 keeps torch's own thread defaults.
+OCR_QUANTIZE = os.environ.get("OCR_QUANTIZE", "1") == "1"
+OCR_TORCH_THREADS = int(os.environ.get("OCR_TORCH_THREADS", "0"))
+OCR_TORCH_INTEROP_THREADS = int(os.environ.get("OCR_TORCH_INTEROP_THREADS", "0"))
+# "torch" runs EasyOCR's networks eagerly; "onnx" runs the models exported by
+# `manage.py export_ocr_onnx` from OCR_ONNX_DIR through onnxruntime.
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "torch")
+OCR_ONNX_DIR = Path(os.environ.get("OCR_ONNX_DIR", BASE_DIR / "ocr_models"))
+# Text detection runs on a copy downsampled to this long side (0 = full
+# resolution); recognition always uses the full-resolution image.
+OCR_DETECTION_MAX_SIDE = int(os.environ.get("OCR_DETECTION_MAX_SIDE", "1600"))
+# Targeted verification reads only digits and stops once the voter's known
+# number is found; full transcription runs when it is not found, when the
+# rules still fail, and for a random audit share of passes.
+OCR_TARGETED_VERIFICATION = os.environ.get("OCR_TARGETED_VERIFICATION", "0") == "1"
+OCR_TARGETED_AUDIT_RATE = float(os.environ.get("OCR_TARGETED_AUDIT_RATE", "0.05"))
+# How the national ID and voter card of one upload are OCR'd: "serial",
+# "threaded" (both at once in-process) or "batched" (one OCR server request).
+OCR_PAIR_MODE = os.environ.get("OCR_PAIR_MODE", "serial")
+# With OCR_ASYNC_VALIDATION uploads are queued and `manage.py run_ocr_worker`
+# validates them; documents stay "pending" meanwhile. A claimed job is leased
+# for OCR_WORKER_VISIBILITY_TIMEOUT seconds before another worker may retry it,
+# and failed attempts back off exponentially from OCR_WORKER_RETRY_DELAY.
+OCR_ASYNC_VALIDATION = os.environ.get("OCR_ASYNC_VALIDATION", "0") == "1"
+OCR_WORKER_CONCURRENCY = int(os.environ.get("OCR_WORKER_CONCURRENCY", "2"))
+OCR_WORKER_MAX_ATTEMPTS = int(os.environ.get("OCR_WORKER_MAX_ATTEMPTS", "3"))
+OCR_WORKER_RETRY_DELAY = float(os.environ.get("OCR_WORKER_RETRY_DELAY", "30"))
+OCR_WORKER_VISIBILITY_TIMEOUT = float(os.environ.get("OCR_WORKER_VISIBILITY_TIMEOUT", "600"))
+OCR_WORKER_POLL_INTERVAL = float(os.environ.get("OCR_WORKER_POLL_INTERVAL", "2"))
+# Host-wide limit on OCR passes running at once across all gunicorn workers
+# and OCR workers (0 = unlimited). Uploads beyond it are queued for
+# run_ocr_worker and told their queue position instead of waiting.
+OCR_MAX_INFLIGHT = int(os.environ.get("OCR_MAX_INFLIGHT", "0"))
+OCR_ADMISSION_DIR = Path(os.environ.get("OCR_ADMISSION_DIR", BASE_DIR / "run" / "ocr-slots"))
+# Quality gate run before any OCR model. Photos below these limits are
+# rejected with a specific message; the measured metrics are stored on each
+# document (IDDocument.quality_metrics) for tuning. Sharpness is the variance
+# of the Laplacian on an 800px copy; brightness is the mean grey level and
+# OCR_QUALITY_MAX_CLIPPED the largest share of crushed/blown pixels. Off by
+# default until the limits are calibrated on real uploads; the metrics are
+# measured and stored either way.
+OCR_QUALITY_GATE = os.environ.get("OCR_QUALITY_GATE", "0") == "1"
+OCR_QUALITY_MIN_SIDE = int(os.environ.get("OCR_QUALITY_MIN_SIDE", "300"))
+OCR_QUALITY_MIN_SHARPNESS = float(os.environ.get("OCR_QUALITY_MIN_SHARPNESS", "15"))
+OCR_QUALITY_MIN_BRIGHTNESS = float(os.environ.get("OCR_QUALITY_MIN_BRIGHTNESS", "35"))
+OCR_QUALITY_MAX_BRIGHTNESS = float(os.environ.get("OCR_QUALITY_MAX_BRIGHTNESS", "235"))
+OCR_QUALITY_MAX_CLIPPED = float(os.environ.get("OCR_QUALITY_MAX_CLIPPED", "0.5"))
+OCR_QUALITY_REQUIRE_CARD = os.environ.get("OCR_QUALITY_REQUIRE_CARD", "0") == "1"
+# Field localization (opt-in): find the card's edges, warp it to a canonical
+# 1000x630 frame and recognise only these regions, given as fractions
+# (x0, y0, x1, y1) of that frame. Falls back to the full pipeline when no card
+# is found or the rules fail. Calibrate the regions on real cards first;
+# OCR_FIELD_LAYOUTS takes a JSON object to replace them.
+OCR_FIELD_LOCALIZATION = os.environ.get("OCR_FIELD_LOCALIZATION", "0") == "1"
+OCR_FIELD_LAYOUTS = json.loads(os.environ.get("OCR_FIELD_LAYOUTS", "null")) or {
+    "national_id": {
+        "number": [0.04, 0.08, 0.62, 0.24],
+        "birth_date": [0.30, 0.60, 0.72, 0.74],
+    },
+    "voter_card": {
+        "number": [0.04, 0.76, 0.62, 0.92],
+    },
+}
+# OCR engines: "easyocr" (full pipeline) or "tesseract" (digits only; needs
+# pytesseract and the tesseract binary). OCR_ENGINES maps a document type to a
+# cascade tried cheapest first, escalating only when the result fails
+# validation, e.g. {"voter_card": ["tesseract", "easyocr"]}.
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "easyocr")
+OCR_ENGINES = json.loads(os.environ.get("OCR_ENGINES", "{}"))
+# Results are cached by image content hash so re-uploads of the same photo skip OCR.
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get("OCR_CACHE_MAX_ENTRIES", "20000"))
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voter_portal.settings')
 
 application = get_wsgi_application()
+
+if settings.OCR_WARM_UP and not settings.OCR_SERVER_SOCKET:
+    # Load the OCR models at worker boot instead of on the first upload.
+    from voters.services.ocr import warm_up
+
+    warm_up()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import IDDocument, Voter
+from .models import IDDocument, ImportManifest, ValidationJob, Voter
 
 
 class IDDocumentInline(admin.TabularInline):
@@ -12,6 +12,7 @@ class IDDocumentInline(admin.TabularInline):
         "validation_status",
         "validation_errors",
         "extracted_text",
+        "quality_metrics",
     )
     fields = (
         "document_type",
@@ -21,6 +22,7 @@ class IDDocumentInline(admin.TabularInline):
         "validation_status",
         "validation_errors",
         "extracted_text",
+        "quality_metrics",
     )
 
 
@@ -50,3 +52,36 @@ class IDDocumentAdmin(admin.ModelAdmin):
     )
     list_filter = ("document_type", "review_status", "validation_status", "uploaded_at")
     search_fields = ("voter__full_name", "voter__voter_number")
+
+
+@admin.register(ValidationJob)
+class ValidationJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "voter",
+        "status",
+        "attempts",
+        "run_after",
+        "locked_by",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status",)
+    search_fields = ("voter__full_name", "voter__voter_number")
+    readonly_fields = ("last_error",)
+
+
+@admin.register(ImportManifest)
+class ImportManifestAdmin(admin.ModelAdmin):
+    list_display = (
+        "kind",
+        "source",
+        "finished_at",
+        "total_rows",
+        "created",
+        "updated",
+        "unchanged",
+        "deactivated",
+        "error_count",
+    )
+    list_filter = ("kind",)
+    readonly_fields = ("file_digest", "started_at", "finished_at")
@@ -0,0 +1,136 @@
+import re
+import statistics
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from voters.models import IDDocument
+from voters.services.ocr import _get_reader, _read_document_local, normalize_digits
+from voters.services.uploads import original_path
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure OCR latency and accuracy for several detection resolutions, for "
+        "fp32 versus int8 models, or for the torch versus ONNX backends. The first variant is the reference the others are "
+        "compared against."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Image files or directories of images to benchmark.",
+        )
+        parser.add_argument(
+            "--documents",
+            type=int,
+            default=0,
+            help="Also benchmark the N most recent uploaded documents, checking their expected numbers.",
+        )
+        parser.add_argument(
+            "--max-side",
+            type=int,
+            nargs="+",
+            default=[0, 2048, 1600, 1280, 1024],
+            help="OCR_DETECTION_MAX_SIDE values to compare (0 = full resolution).",
+        )
+        parser.add_argument(
+            "--compare-quantization",
+            action="store_true",
+            help="Compare fp32 against int8 models at the configured resolution instead.",
+        )
+        parser.add_argument(
+            "--compare-backends",
+            action="store_true",
+            help="Compare the torch and ONNX Runtime backends at the configured resolution instead.",
+        )
+
+    def handle(self, *args, **options):
+        samples = self._collect_samples(options["paths"], options["documents"])
+        if not samples:
+            raise CommandError("No images to benchmark. Pass image paths or --documents N.")
+
+        # Each variant is the (backend, quantize, detection max side) its
+        # reader is built with; the rest of the OCR settings stay as configured.
+        backend, quantize = settings.OCR_BACKEND, settings.OCR_QUANTIZE
+        max_side = settings.OCR_DETECTION_MAX_SIDE
+        if options["compare_backends"]:
+            variants = [
+                ("torch", ("torch", quantize, max_side)),
+                ("onnx", ("onnx", quantize, max_side)),
+            ]
+        elif options["compare_quantization"]:
+            variants = [
+                ("fp32", ("torch", False, max_side)),
+                ("int8", ("torch", True, max_side)),
+            ]
+        else:
+            variants = [
+                (f"max_side={side or 'full'}", (backend, quantize, side))
+                for side in options["max_side"]
+            ]
+
+        self.stdout.write(f"Benchmarking {len(samples)} images...")
+        reference: dict[str, str] = {}
+        for label, reader_options in variants:
+            latencies, similarities, hits, checked = [], [], 0, 0
+            # Build the reader for this variant before timing anything.
+            _get_reader.cache_clear()
+            reader = _get_reader(*reader_options)
+            for path, expected in samples:
+                started = time.perf_counter()
+                result = _read_document_local(path, reader=reader)
+                latencies.append(time.perf_counter() - started)
+
+                text = normalize_digits(result.text if result else "")
+                reference.setdefault(path, text)
+                similarities.append(SequenceMatcher(None, reference[path], text).ratio())
+                if expected:
+                    checked += 1
+                    hits += int(expected in re.sub(r"\D", "", text))
+
+            self.stdout.write(self._format_row(label, latencies, similarities, hits, checked))
+        _get_reader.cache_clear()
+
+    def _collect_samples(self, paths, documents):
+        samples: list[tuple[str, str]] = []
+        for raw in paths:
+            path = Path(raw).expanduser()
+            if path.is_dir():
+                files = sorted(p for p in path.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+            elif path.exists():
+                files = [path]
+            else:
+                raise CommandError(f"Could not find {path}")
+            samples.extend((str(p), "") for p in files)
+
+        if documents:
+            queryset = IDDocument.objects.select_related("voter").order_by("-uploaded_at")[:documents]
+            for document in queryset:
+                if document.document_type == IDDocument.DocumentType.NATIONAL_ID:
+                    expected = document.voter.national_id_number
+                else:
+                    expected = document.voter.voter_number
+                # The untouched upload, as OCR reads it, so orientation and
+                # cropping are part of what is measured.
+                path = original_path(document.image.path) or document.image.path
+                samples.append((path, re.sub(r"\D", "", expected or "")))
+        return samples
+
+    def _format_row(self, label, latencies, similarities, hits, checked):
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        row = (
+            f"{label:<15}  mean={statistics.mean(latencies):.2f}s  "
+            f"median={statistics.median(latencies):.2f}s  p95={p95:.2f}s  "
+            f"text_agreement={statistics.mean(similarities):.3f}"
+        )
+        if checked:
+            row += f"  expected_number_found={hits}/{checked}"
+        return row
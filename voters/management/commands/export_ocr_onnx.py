@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import easyocr
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voters.services.ocr_onnx import export_models
+
+
+class Command(BaseCommand):
+    help = "Export EasyOCR's detector and recogniser to ONNX for OCR_BACKEND=onnx."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Directory to write the models to (defaults to OCR_ONNX_DIR).",
+        )
+
+    def handle(self, *args, **options):
+        output_dir = Path(options["output"] or settings.OCR_ONNX_DIR)
+        # Export the fp32 networks; dynamically quantized layers do not export.
+        reader = easyocr.Reader(["ar", "en"], gpu=False, quantize=False)
+        for path in export_models(reader, output_dir):
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
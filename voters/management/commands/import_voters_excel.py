@@ -1,45 +1,112 @@
 from pathlib import Path
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from voters.services.importers import import_voters_from_excel
+from voters.services.importers import (
+    DEFAULT_BATCH_SIZE,
+    ImportFileError,
+    import_voters_from_workbooks,
+    progress_line,
+    sheet_names,
+)
 
 
 class Command(BaseCommand):
     help = "Import voters from an Excel workbook. Expects columns: رقم الناخب (voter number), الاسم الثلاثي, المواليد, الاسم الصحيح (optional)."
 
     def add_arguments(self, parser):
-        parser.add_argument("excel_path", type=str, help="Path to the Excel file.")
+        parser.add_argument(
+            "excel_path", type=str, nargs="+", help="Path to the Excel file (or several)."
+        )
         parser.add_argument(
             "--sheet",
             type=str,
             default=None,
             help="Specific sheet name to import (defaults to the first sheet).",
         )
+        parser.add_argument(
+            "--all-sheets",
+            action="store_true",
+            help="Import every sheet of each workbook.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes parsing sheets concurrently when there are several.",
+        )
+        parser.add_argument(
+            "--deactivate-missing",
+            action="store_true",
+            help="Deactivate voters not present in any imported sheet.",
+        )
         parser.add_argument(
             "--dry-run",
             action="store_true",
             help="Parse without writing any data.",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows written (and committed) per batch.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue an interrupted import of the same files from its checkpoint.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=str(settings.BASE_DIR / "run" / "import_voters_excel.json"),
+            help="File recording the rows already imported.",
+        )
+        parser.add_argument(
+            "--error-report",
+            default=str(settings.BASE_DIR / "run" / "import_voters_excel_errors.txt"),
+            help="File listing the rows with errors.",
+        )
 
     def handle(self, *args, **options):
-        excel_path = Path(options["excel_path"]).expanduser()
+        excel_paths = [Path(path).expanduser() for path in options["excel_path"]]
         sheet = options["sheet"]
         dry_run = options["dry_run"]
 
-        if not excel_path.exists():
-            raise CommandError(f"Could not find Excel file at {excel_path}")
+        for excel_path in excel_paths:
+            if not excel_path.exists():
+                raise CommandError(f"Could not find Excel file at {excel_path}")
+        if sheet and options["all_sheets"]:
+            raise CommandError("Use either --sheet or --all-sheets, not both.")
 
-        result = import_voters_from_excel(excel_path, sheet_name=sheet, dry_run=dry_run)
+        sources = [
+            (excel_path, name)
+            for excel_path in excel_paths
+            for name in (sheet_names(excel_path) if options["all_sheets"] else [sheet])
+        ]
+        error_report = Path(options["error_report"])
+        try:
+            result = import_voters_from_workbooks(
+                sources,
+                dry_run=dry_run,
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                deactivate_missing=options["deactivate_missing"],
+                checkpoint=Path(options["checkpoint"]),
+                resume=options["resume"],
+                error_report=error_report,
+                progress=lambda result, total: self.stdout.write(progress_line(result, total)),
+            )
+        except ImportFileError as exc:
+            raise CommandError(str(exc)) from exc
 
         message = (
-            f"Parsed {result.total_rows} rows. "
-            f"Created {result.created}, updated {result.updated}."
+            f"Parsed {result.total_rows} rows ({result.rows_per_second:.0f} rows/s). "
+            f"Created {result.created}, updated {result.updated}, "
+            f"unchanged {result.unchanged}, deactivated {result.deactivated}."
         )
         if result.errors:
-            message += f" Encountered {len(result.errors)} errors."
-            for err in result.errors:
-                self.stderr.write(self.style.ERROR(err))
+            message += f" Encountered {len(result.errors)} errors; see {error_report}."
 
         if dry_run:
             self.stdout.write(self.style.SUCCESS("Dry run complete. " + message))
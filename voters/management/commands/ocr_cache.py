@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from voters.services import ocr_cache
+
+
+class Command(BaseCommand):
+    help = "Show OCR result cache statistics, trim it to OCR_CACHE_MAX_ENTRIES, or clear it."
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete every cached OCR result.",
+        )
+        group.add_argument(
+            "--evict",
+            action="store_true",
+            help="Drop least recently used entries beyond the configured limit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted = ocr_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Cleared {deleted} cached OCR results."))
+            return
+        if options["evict"]:
+            deleted = ocr_cache.evict()
+            self.stdout.write(self.style.SUCCESS(f"Evicted {deleted} cached OCR results."))
+            return
+
+        stats = ocr_cache.stats()
+        self.stdout.write(
+            f"Entries: {stats['entries']} / {stats['max_entries']}\n"
+            f"Total hits: {stats['total_hits'] or 0}\n"
+            f"Oldest entry: {stats['oldest'] or '-'}\n"
+            f"Last used: {stats['last_used'] or '-'}"
+        )
@@ -0,0 +1,190 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from voters.models import IDDocument
+from voters.services.document_checks import VALIDATION_FIELDS, assign_validation, read_and_confirm
+from voters.services.ocr import OCRResult, pipeline_version, warm_up
+from voters.services.ocr_admission import ocr_slot
+
+
+def _init_worker(torch_threads: int) -> None:
+    if torch_threads and not settings.OCR_TORCH_THREADS:
+        import torch
+
+        torch.set_num_threads(torch_threads)
+    # One reader per worker process, loaded before the first document; with
+    # an OCR server the inference happens there instead.
+    if not settings.OCR_SERVER_SOCKET:
+        warm_up()
+
+
+def _reocr(document: IDDocument) -> tuple[int, dict | None, str]:
+    while True:
+        # Shares the host-wide OCR slots with live uploads, so a backfill never
+        # takes more than its share of OCR_MAX_INFLIGHT.
+        with ocr_slot(wait=5) as admitted:
+            if not admitted:
+                continue
+            try:
+                # The same engine cascade and checks as an upload, but never
+                # served from the OCR cache: the point is to read it again.
+                result = read_and_confirm(document, use_cache=False)
+            except Exception as exc:
+                return document.pk, None, str(exc)
+            return document.pk, result.to_dict() if result else None, ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the current OCR pipeline over every stored document again, in "
+        "parallel, checkpointing progress so an interrupted run resumes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(1, (os.cpu_count() or 2) // 2),
+            help="OCR worker processes, each holding one reader (default: half the cores).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=0,
+            help="Documents per checkpointed batch (default: 8 per worker).",
+        )
+        parser.add_argument(
+            "--max-rate",
+            type=float,
+            default=0,
+            help="Cap throughput at this many images per second (0 = no cap).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=str(settings.BASE_DIR / "run" / "reprocess_documents.json"),
+            help="File recording the last finished document.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the first document.",
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        batch_size = options["batch_size"] or workers * 8
+        checkpoint = Path(options["checkpoint"])
+        state = self._load_checkpoint(checkpoint, options["restart"])
+        failed = set(state.setdefault("failed", []))
+        if state["last_pk"]:
+            self.stdout.write(
+                f"Resuming after document {state['last_pk']} ({state['processed']} already done, "
+                f"{len(failed)} to retry)."
+            )
+
+        queryset = IDDocument.objects.select_related("voter").order_by("pk")
+        # Documents that failed in an earlier run are retried first.
+        retry = sorted(failed)
+        remaining = len(retry) + queryset.filter(pk__gt=state["last_pk"]).count()
+        self.stdout.write(f"Re-processing {remaining} documents with {workers} workers...")
+
+        # Forked workers must not inherit open database connections.
+        connections.close_all()
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        started = time.perf_counter()
+        done = errors = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(torch_threads,),
+        ) as pool:
+            while True:
+                batch_started = time.perf_counter()
+                if retry:
+                    pks, retry = retry[:batch_size], retry[batch_size:]
+                    batch = list(queryset.filter(pk__in=pks))
+                    # Deleted since they failed.
+                    failed.difference_update(set(pks) - {document.pk for document in batch})
+                    if not batch:
+                        continue
+                else:
+                    # Keyset pagination on pk; the checkpoint is the last pk
+                    # written, plus the pks that failed.
+                    batch = list(queryset.filter(pk__gt=state["last_pk"])[:batch_size])
+                    if not batch:
+                        break
+                    state["last_pk"] = batch[-1].pk
+
+                outcomes = {pk: (payload, error) for pk, payload, error in pool.map(_reocr, batch)}
+                updated = []
+                for document in batch:
+                    payload, error = outcomes[document.pk]
+                    if error:
+                        errors += 1
+                        failed.add(document.pk)
+                        self.stderr.write(f"Document {document.pk}: {error}")
+                        continue
+                    failed.discard(document.pk)
+                    result = OCRResult.from_dict(payload) if payload else None
+                    updated.append(assign_validation(document, result))
+                with transaction.atomic():
+                    IDDocument.objects.bulk_update(updated, VALIDATION_FIELDS, batch_size=500)
+
+                done += len(batch)
+                state["processed"] += len(updated)
+                state["failed"] = sorted(failed)
+                self._save_checkpoint(checkpoint, state)
+
+                if options["max_rate"]:
+                    pause = len(batch) / options["max_rate"] - (time.perf_counter() - batch_started)
+                    if pause > 0:
+                        time.sleep(pause)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{done}/{remaining} documents ({done / elapsed:.2f} images/s, {errors} errors)"
+                )
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Re-processed {done} documents in {elapsed:.0f}s ({rate:.2f} images/s, {errors} errors)."
+            )
+        )
+        if failed:
+            # Keep the checkpoint so the next run retries just these.
+            self.stderr.write(
+                f"{len(failed)} documents failed; run the command again to retry them."
+            )
+        else:
+            checkpoint.unlink(missing_ok=True)
+
+    def _load_checkpoint(self, path: Path, restart: bool) -> dict:
+        fresh = {"pipeline": pipeline_version(), "last_pk": 0, "processed": 0, "failed": []}
+        if restart or not path.exists():
+            return fresh
+        try:
+            state = json.loads(path.read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Unreadable checkpoint {path}: {exc}. Use --restart.") from exc
+        if state.get("pipeline") != fresh["pipeline"]:
+            raise CommandError(
+                f"Checkpoint {path} was written by OCR pipeline {state.get('pipeline')}, "
+                f"not {fresh['pipeline']}. Use --restart."
+            )
+        return state
+
+    def _save_checkpoint(self, path: Path, state: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(state))
+        os.replace(temp_path, path)
@@ -0,0 +1,89 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from voters.models import IDDocument
+from voters.services.document_checks import revalidate
+
+# Only these change when the rules are re-run; OCR and quality data stay as stored.
+REVALIDATED_FIELDS = ["extracted_text", "validation_status", "validation_errors"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-apply the current validation rules to the OCR output stored on each "
+        "document, without running OCR. Voter records are not modified."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Documents loaded and written per batch.",
+        )
+        parser.add_argument(
+            "--document-type",
+            choices=IDDocument.DocumentType.values,
+            help="Only revalidate one document type.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = (
+            IDDocument.objects.filter(ocr_data__has_key="text")
+            .select_related("voter")
+            .only(
+                "id",
+                "document_type",
+                "ocr_data",
+                *REVALIDATED_FIELDS,
+                "voter__voter_number",
+                "voter__birth_year",
+                "voter__national_id_number",
+            )
+            .order_by("pk")
+        )
+        if options["document_type"]:
+            queryset = queryset.filter(document_type=options["document_type"])
+
+        started = time.perf_counter()
+        checked = 0
+        transitions = Counter()
+        last_pk = 0
+        while True:
+            # Keyset pagination: cost per batch stays flat however deep we are.
+            batch = list(queryset.filter(pk__gt=last_pk)[: options["batch_size"]])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            changed = []
+            for document in batch:
+                before = document.validation_status
+                if revalidate(document):
+                    changed.append(document)
+                    transitions[(before or "-", document.validation_status)] += 1
+            if changed and not options["dry_run"]:
+                with transaction.atomic():
+                    IDDocument.objects.bulk_update(changed, REVALIDATED_FIELDS, batch_size=500)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{checked} documents checked ({checked / elapsed:.0f}/s)")
+
+        elapsed = time.perf_counter() - started
+        verb = "Would update" if options["dry_run"] else "Updated"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {sum(transitions.values())} of {checked} documents in {elapsed:.1f}s."
+            )
+        )
+        for (before, after), count in sorted(transitions.items()):
+            self.stdout.write(f"  {before} -> {after}: {count}")
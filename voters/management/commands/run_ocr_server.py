@@ -0,0 +1,52 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from voters.services.ocr_server import create_server
+
+
+class Command(BaseCommand):
+    help = "Load the OCR model once and serve OCR requests from web workers over a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            type=str,
+            default=None,
+            help="Unix socket path (defaults to OCR_SERVER_SOCKET).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Concurrent inference workers (defaults to OCR_SERVER_WORKERS).",
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options["socket"] or settings.OCR_SERVER_SOCKET
+        workers = options["workers"] or settings.OCR_SERVER_WORKERS
+        if not socket_path:
+            raise CommandError("Set OCR_SERVER_SOCKET or pass --socket.")
+
+        try:
+            server = create_server(socket_path, workers)
+        except OSError as exc:
+            raise CommandError(f"Failed to bind OCR server at {socket_path}: {exc}") from exc
+
+        def _stop(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, _stop)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"OCR server listening on {socket_path} with {workers} workers."
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(self.style.WARNING("OCR server stopped."))
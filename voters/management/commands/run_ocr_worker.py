@@ -0,0 +1,60 @@
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voters.services.ocr import warm_up
+from voters.services.validation_queue import work
+
+
+class Command(BaseCommand):
+    help = "Validate queued document uploads (OCR_ASYNC_VALIDATION) in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Jobs to run at once (defaults to OCR_WORKER_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of polling for new ones.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"] or settings.OCR_WORKER_CONCURRENCY)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stop = threading.Event()
+
+        def _stop(signum, frame):
+            # Let in-flight jobs finish; anything cut short is recovered when
+            # its lease expires.
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        if not settings.OCR_SERVER_SOCKET:
+            warm_up()
+
+        counts = []
+        threads = [
+            threading.Thread(
+                target=lambda name: counts.append(work(name, stop, once=options["once"])),
+                args=(f"{worker_id}:{index}",),
+            )
+            for index in range(concurrency)
+        ]
+        self.stdout.write(
+            self.style.SUCCESS(f"OCR worker {worker_id} running {concurrency} jobs at a time.")
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.WARNING(f"OCR worker stopped after {sum(counts)} jobs."))
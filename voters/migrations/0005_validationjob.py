@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0004_ocrcacheentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='iddocument',
+            name='validation_status',
+            field=models.CharField(blank=True, choices=[('pending', 'قيد التحقق'), ('passed', 'تم التحقق'), ('failed', 'فشل التحقق')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ValidationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(db_index=True)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('national_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='voters.iddocument')),
+                ('voter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='validation_jobs', to='voters.voter')),
+                ('voter_card_document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='voters.iddocument')),
+            ],
+            options={
+                'ordering': ['run_after', 'pk'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='voters_vali_status_061fe2_idx')],
+            },
+        ),
+    ]
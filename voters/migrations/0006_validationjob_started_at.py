@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0005_validationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validationjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0006_validationjob_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iddocument',
+            name='ocr_data',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
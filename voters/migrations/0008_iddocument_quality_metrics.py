@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voters', '0007_iddocument_ocr_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iddocument',
+            name='quality_metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
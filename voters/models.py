@@ -25,6 +25,9 @@ class Voter(models.Model):
     notes = models.TextField(blank=True)
     birth_year = models.PositiveIntegerField(blank=True, null=True)
     national_id_number = models.CharField(max_length=32, blank=True)
+    # Hash of the row the last import supplied; a re-import whose row hashes
+    # the same leaves the voter untouched.
+    import_fingerprint = models.CharField(max_length=32, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -62,13 +65,104 @@ class IDDocument(models.Model):
     extracted_text = models.TextField(blank=True)
     validation_status = models.CharField(
         max_length=20,
-        choices=[("passed", "تم التحقق"), ("failed", "فشل التحقق")],
+        choices=[
+            ("pending", "قيد التحقق"),
+            ("passed", "تم التحقق"),
+            ("failed", "فشل التحقق"),
+        ],
         blank=True,
     )
     validation_errors = models.TextField(blank=True)
+    # Compact OCR output (boxes, words, confidences, angle, crop) so the
+    # validation rules can be re-run without OCR; see revalidate_documents.
+    ocr_data = models.JSONField(default=dict, blank=True)
+    # Image quality metrics measured before OCR (sharpness, exposure, size).
+    quality_metrics = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ["-uploaded_at"]
 
     def __str__(self) -> str:
         return f"ID for {self.voter.full_name} at {self.uploaded_at:%Y-%m-%d %H:%M}"
+
+
+class OCRCacheEntry(models.Model):
+    """OCR output keyed by image content and pipeline version."""
+
+    key = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"OCR cache {self.key[:12]}"
+
+
+class ValidationJob(models.Model):
+    """Queued OCR validation of one uploaded national ID / voter card pair."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "في الانتظار"
+        RUNNING = "running", "قيد التنفيذ"
+        DONE = "done", "مكتمل"
+        FAILED = "failed", "فشل"
+
+    voter = models.ForeignKey(
+        Voter, related_name="validation_jobs", on_delete=models.CASCADE
+    )
+    national_document = models.ForeignKey(
+        IDDocument, related_name="+", on_delete=models.CASCADE
+    )
+    voter_card_document = models.ForeignKey(
+        IDDocument, related_name="+", on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # Not claimable before this time; pushed back exponentially after failures.
+    run_after = models.DateTimeField(db_index=True)
+    # A running job whose lease expired belongs to a crashed or stuck worker
+    # and can be claimed again.
+    locked_until = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker last claimed it; started_at - created_at is the queue wait.
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["run_after", "pk"]
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self) -> str:
+        return f"Validation job {self.pk} for {self.voter.voter_number} ({self.status})"
+
+
+class ImportManifest(models.Model):
+    """One run of import_voters or import_voters_excel and what it changed."""
+
+    class Kind(models.TextChoices):
+        CSV = "csv", "CSV"
+        EXCEL = "excel", "Excel"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    source = models.TextField()
+    # sha256 over the imported files, in order.
+    file_digest = models.CharField(max_length=64)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    deactivated = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-finished_at"]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} import of {self.source} at {self.finished_at:%Y-%m-%d %H:%M}"
@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import random
 import re
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
 
 from voters.models import IDDocument, Voter
-from voters.services.ocr import extract_text, normalize_digits
+from voters.services.ocr import (
+    OCRJob,
+    OCRResult,
+    engines_for,
+    normalize_digits,
+    pipeline_version,
+    read_documents,
+)
+from voters.services.uploads import original_path
+
+PAIR_MODES = ("serial", "threaded", "batched")
 
 
 class DocumentProcessingError(Exception):
@@ -14,12 +27,70 @@ class DocumentProcessingError(Exception):
 
 def process_document(document: IDDocument) -> IDDocument:
     """Run OCR checks against an uploaded document and persist validation results."""
+    result = read_and_confirm(document)
+    with transaction.atomic():
+        return _apply_validation(document, result)
+
+
+def mark_documents_failed(documents: list[IDDocument], message: str) -> None:
+    """Record an OCR failure so the documents do not stay unvalidated."""
+    for document in documents:
+        document.validation_status = "failed"
+        document.validation_errors = message
+    IDDocument.objects.filter(pk__in=[doc.pk for doc in documents]).update(
+        validation_status="failed", validation_errors=message
+    )
+
+
+def _expected_digits(document: IDDocument) -> str:
+    """The number the document should show, when targeted verification applies."""
+    if not settings.OCR_TARGETED_VERIFICATION:
+        return ""
+    if random.random() < settings.OCR_TARGETED_AUDIT_RATE:
+        # Audit sample: transcribe in full even though the number is known.
+        return ""
+    if document.document_type == IDDocument.DocumentType.NATIONAL_ID:
+        number = document.voter.national_id_number
+    else:
+        number = document.voter.voter_number
+    return re.sub(r"\D", "", number or "")
+
+
+def _run_ocr(
+    documents: list[IDDocument],
+    *,
+    batch: bool = False,
+    targeted: bool = True,
+    engine: str = "",
+    use_cache: bool = True,
+) -> list[OCRResult | None]:
+    # targeted=False forces a full transcription: no expected-number or
+    # field-localization shortcuts. Without an engine each document starts
+    # at the cheapest engine of its cascade. OCR reads the untouched upload
+    # (from memory when the view still holds it) and writes the processed
+    # image over the document's own file; a document whose upload is gone is
+    # read from its processed image, which is then left as it is.
+    originals = [original_path(doc.image.path) for doc in documents]
+    jobs = [
+        OCRJob(
+            original or doc.image.path,
+            doc.image.path if original else None,
+            _expected_digits(doc) if targeted else "",
+            doc.document_type if targeted else "",
+            engine or engines_for(doc.document_type)[0],
+            data=getattr(doc, "upload_data", None),
+        )
+        for doc, original in zip(documents, originals)
+    ]
     try:
-        processed_path = document.image.path
-        raw_text = extract_text(document.image.path, processed_path=processed_path)
+        return read_documents(jobs, batch=batch, use_cache=use_cache)
     except Exception as exc:  # pragma: no cover - easyocr internal errors
         raise DocumentProcessingError(f"تعذر قراءة الصورة: {exc}") from exc
 
+
+def _collect_errors(
+    document: IDDocument, raw_text: str, *, persist: bool = True, fields: dict | None = None
+) -> tuple[str, list[str]]:
     normalized_text = normalize_digits(raw_text)
     text_no_whitespace = re.sub(r"\s+", "", normalized_text)
     errors: list[str] = []
@@ -28,27 +99,148 @@ def process_document(document: IDDocument) -> IDDocument:
         errors.append("لم يتم التعرف على نص كافٍ من الصورة.")
 
     if document.document_type == IDDocument.DocumentType.NATIONAL_ID:
-        errors.extend(_validate_national_id(document.voter, normalized_text))
+        errors.extend(
+            _validate_national_id(
+                document.voter,
+                normalized_text,
+                persist=persist,
+                number=(fields or {}).get("number", ""),
+            )
+        )
     elif document.document_type == IDDocument.DocumentType.VOTER_CARD:
         errors.extend(_validate_voter_card(document.voter, text_no_whitespace))
+    return normalized_text, errors
+
+
+def _confirm_result(
+    document: IDDocument, result: OCRResult | None, *, use_cache: bool = True
+) -> OCRResult | None:
+    """Escalate a result that would fail validation until one can be trusted.
+
+    A cheaper engine's output, or a targeted or field-only shortcut, stands
+    only if the rules pass on it. Otherwise the next engine in the document
+    type's cascade reads the image, and the last engine finally transcribes it
+    in full.
+    """
+    cascade = engines_for(document.document_type)
+    engine = result.engine if result is not None else cascade[0]
+    position = cascade.index(engine) if engine in cascade else len(cascade) - 1
+    while result is None or result.mode != "rejected":
+        last = position == len(cascade) - 1
+        shortcut = result is not None and result.mode in ("targeted", "fields")
+        if last and not shortcut:
+            return result
+        if result is not None:
+            _, errors = _collect_errors(document, result.text, persist=False, fields=result.fields)
+            if not errors:
+                return result
+        if last:
+            # The shortcut read something but the rules still failed; judge
+            # the document on a full transcription instead.
+            return _run_ocr(
+                [document], targeted=False, engine=cascade[position], use_cache=use_cache
+            )[0]
+        position += 1
+        result = _run_ocr([document], engine=cascade[position], use_cache=use_cache)[0]
+    return result
+
+
+def read_and_confirm(document: IDDocument, *, use_cache: bool = True) -> OCRResult | None:
+    """OCR one document through its engine cascade, as an upload is read.
+
+    ``use_cache=False`` reads the image again even when the OCR cache holds
+    a result for it, e.g. to apply an improved pipeline.
+    """
+    result = _run_ocr([document], use_cache=use_cache)[0]
+    return _confirm_result(document, result, use_cache=use_cache)
 
+
+def _ocr_data(result: OCRResult | None) -> dict:
+    """Columnar copy of ``result`` for ``IDDocument.ocr_data``."""
+    if result is None:
+        return {}
+    return {
+        "version": pipeline_version(),
+        "angle": result.angle,
+        "method": result.orientation_method,
+        "crop": list(result.crop_box) if result.crop_box else None,
+        "mode": result.mode,
+        "text": result.text,
+        "fields": result.fields,
+        # Each box is its four corners flattened to x1, y1, ..., x4, y4.
+        "boxes": [[int(value) for point in bbox for value in point] for bbox, _, _ in result.results],
+        "words": [text for _, text, _ in result.results],
+        "conf": [round(float(confidence), 3) for _, _, confidence in result.results],
+    }
+
+
+VALIDATION_FIELDS = [
+    "extracted_text",
+    "validation_status",
+    "validation_errors",
+    "ocr_data",
+    "quality_metrics",
+]
+
+
+def assign_validation(document: IDDocument, result: OCRResult | None) -> IDDocument:
+    """Set the validation fields from ``result`` without saving the document."""
+    if result is not None and result.mode == "rejected":
+        # The quality gate's own messages say more than "no text found".
+        normalized_text, errors = "", list(result.quality.get("problems", []))
+    else:
+        normalized_text, errors = _collect_errors(
+            document, result.text if result else "", fields=result.fields if result else None
+        )
+    document.quality_metrics = result.quality if result else {}
     document.extracted_text = normalized_text
     document.validation_status = "passed" if not errors else "failed"
     document.validation_errors = "\n".join(errors)
-    document.save(
-        update_fields=["extracted_text", "validation_status", "validation_errors"]
-    )
+    document.ocr_data = _ocr_data(result)
+    return document
+
 
+def _apply_validation(document: IDDocument, result: OCRResult | None) -> IDDocument:
+    assign_validation(document, result).save(update_fields=VALIDATION_FIELDS)
     return document
 
 
-def _validate_national_id(voter: Voter, text: str) -> list[str]:
-    digits = re.findall(r"\d+", text)
-    if not digits:
-        return ["تعذر استخراج رقم الهوية الوطنية من الصورة."]
+def revalidate(document: IDDocument) -> bool:
+    """Re-apply the current rules to ``document.ocr_data`` without saving.
 
-    digits.sort(key=len, reverse=True)
-    id_number = digits[0]
+    Voter records are left untouched. Returns whether any validation field
+    changed, for the caller to ``bulk_update``.
+    """
+    if document.ocr_data.get("mode") == "rejected":
+        # Never OCR'd; the quality gate's verdict stands.
+        return False
+    normalized_text, errors = _collect_errors(
+        document,
+        document.ocr_data.get("text", ""),
+        persist=False,
+        fields=document.ocr_data.get("fields"),
+    )
+    fields = (normalized_text, "passed" if not errors else "failed", "\n".join(errors))
+    current = (document.extracted_text, document.validation_status, document.validation_errors)
+    if fields == current:
+        return False
+    document.extracted_text, document.validation_status, document.validation_errors = fields
+    return True
+
+
+def _validate_national_id(
+    voter: Voter, text: str, *, persist: bool = True, number: str = ""
+) -> list[str]:
+    if number:
+        # Read from the ID number field of the registered card.
+        id_number = number
+    else:
+        digits = re.findall(r"\d+", text)
+        if not digits:
+            return ["تعذر استخراج رقم الهوية الوطنية من الصورة."]
+
+        digits.sort(key=len, reverse=True)
+        id_number = digits[0]
     errors: list[str] = []
     if len(id_number) < 10:
         errors.append("رقم الهوية الوطنية المكتشف أقصر من المتوقع.")
@@ -61,7 +253,7 @@ def _validate_national_id(voter: Voter, text: str) -> list[str]:
                 errors.append(
                     f"سنة الميلاد في الهوية ({year_fragment}) لا تطابق بيانات الناخب ({voter.birth_year})."
                 )
-            elif not voter.birth_year:
+            elif not voter.birth_year and persist:
                 voter.birth_year = year_int
                 voter.save(update_fields=["birth_year"])
         else:
@@ -76,7 +268,7 @@ def _validate_national_id(voter: Voter, text: str) -> list[str]:
             errors.append("رقم الهوية الوطنية لا يطابق الرقم المسجل في النظام.")
     else:
         # Persist the full number for future comparisons when it seems complete.
-        if len(extracted_clean) >= 10:
+        if len(extracted_clean) >= 10 and persist:
             voter.national_id_number = extracted_clean
             voter.save(update_fields=["national_id_number"])
 
@@ -94,6 +286,26 @@ def _validate_voter_card(voter: Voter, text_no_whitespace: str) -> list[str]:
 
 
 def process_document_pair(national_doc: IDDocument, voter_doc: IDDocument):
+    """OCR both documents according to ``OCR_PAIR_MODE`` and validate them in order.
+
+    Only the OCR step differs between modes; validation always runs serially,
+    national ID first, so results match the serial path. OCR runs with no
+    transaction open; the results are written in one short transaction
+    afterwards, so the database is never locked for the length of an OCR pass.
+    """
+    mode = settings.OCR_PAIR_MODE
+    if mode not in PAIR_MODES:
+        raise ImproperlyConfigured(
+            f"OCR_PAIR_MODE must be one of {', '.join(PAIR_MODES)}, got {mode!r}."
+        )
+
+    documents = [national_doc, voter_doc]
+    if mode in ("threaded", "batched"):
+        results = _run_ocr(documents, batch=mode == "batched")
+    else:
+        results = [_run_ocr([doc])[0] for doc in documents]
+    results = [_confirm_result(doc, result) for doc, result in zip(documents, results)]
+
     with transaction.atomic():
-        process_document(national_doc)
-        process_document(voter_doc)
+        for document, result in zip(documents, results):
+            _apply_validation(document, result)
@@ -1,13 +1,34 @@
 from __future__ import annotations
 
+import csv
 import dataclasses
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from itertools import islice
+from multiprocessing import Manager
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator, NamedTuple
 
-from django.db import transaction
+from django.db import connections, transaction
+from django.utils import timezone
 from openpyxl import load_workbook
 
-from voters.models import Voter
+from voters.models import ImportManifest, Voter
+
+# Columns an import may set; anything else on Voter is left alone.
+IMPORT_FIELDS = ("full_name", "email", "birth_year", "national_id_number", "notes", "is_active")
+DEFAULT_BATCH_SIZE = 2000
+# seq, party, voter number, name, mother's name, birth year, province, corrected name
+ARABIC_COLUMNS = 8
 
 
 @dataclasses.dataclass
@@ -16,6 +37,197 @@ class ImportResult:
     updated: int = 0
     total_rows: int = 0
     errors: list[str] = dataclasses.field(default_factory=list)
+    elapsed: float = 0.0
+    unchanged: int = 0
+    deactivated: int = 0
+    # Rows already imported by the interrupted run this one resumed.
+    resumed_rows: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        done = self.total_rows - self.resumed_rows
+        return done / self.elapsed if self.elapsed else 0.0
+
+
+# Counters kept in an import checkpoint; errors live in the error report.
+CHECKPOINT_COUNTERS = ("created", "updated", "unchanged", "total_rows")
+
+
+class ImportFileError(Exception):
+    """An import file or checkpoint that cannot be used; nothing was written."""
+
+
+class ImportRow(NamedTuple):
+    voter_number: str
+    # None when the row is skipped.
+    values: dict | None
+    errors: list[str]
+
+
+def fingerprint(values: dict) -> str:
+    """Stable hash of a normalized import row (the columns it sets and their values)."""
+    encoded = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class VoterWriter:
+    """Applies imported rows with bulk queries instead of one update_or_create per row.
+
+    Existing voters are loaded once as voter_number -> (pk, import
+    fingerprint, is_active). A row whose fingerprint matches the stored one is
+    skipped without a write; the rest are buffered and written ``batch_size``
+    at a time, each update touching only the columns whose value changed.
+    """
+
+    def __init__(self, result: ImportResult, *, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.result = result
+        self.batch_size = batch_size
+        # voter_number -> (pk, fingerprint, is_active) as of the last add();
+        # pk is None until a pending create is flushed.
+        self._known: dict[str, tuple[int | None, str, bool]] = {
+            number: (pk, stored, active)
+            for pk, number, stored, active in Voter.objects.order_by()
+            .values_list("pk", "voter_number", "import_fingerprint", "is_active")
+            .iterator(chunk_size=10_000)
+        }
+        self._seen: set[str] = set()
+        self._creates: dict[str, Voter] = {}
+        self._updates: dict[int, dict] = {}
+
+    def add(self, voter_number: str, values: dict) -> None:
+        repeat = voter_number in self._seen
+        self._seen.add(voter_number)
+        digest = fingerprint(values)
+        known = self._known.get(voter_number)
+        if known is None:
+            self._creates[voter_number] = Voter(
+                voter_number=voter_number, import_fingerprint=digest, **values
+            )
+            self._known[voter_number] = (None, digest, values.get("is_active", True))
+            self.result.created += 1
+        else:
+            pk, stored, active = known
+            # is_active also changes outside imports (--deactivate-missing).
+            if digest == stored and values.get("is_active", active) == active:
+                # A number repeated in the file counts as updated, as it did
+                # with update_or_create, though nothing needs writing.
+                if repeat:
+                    self.result.updated += 1
+                else:
+                    self.result.unchanged += 1
+                return
+            self.result.updated += 1
+            self._known[voter_number] = (pk, digest, values.get("is_active", active))
+            if pk is None:
+                # Repeated number whose create is still buffered.
+                voter = self._creates[voter_number]
+                for name, value in values.items():
+                    setattr(voter, name, value)
+                voter.import_fingerprint = digest
+            else:
+                self._updates.setdefault(pk, {}).update(values, import_fingerprint=digest)
+
+        if len(self._creates) + len(self._updates) >= self.batch_size:
+            self.flush()
+
+    def skip(self, voter_number: str) -> None:
+        """Count a row written by an earlier run as listed, for deactivate_missing()."""
+        self._seen.add(voter_number)
+
+    def flush(self) -> None:
+        if not self._creates and not self._updates:
+            return
+        with transaction.atomic():
+            created = Voter.objects.bulk_create(self._creates.values(), batch_size=self.batch_size)
+            self._write_updates()
+
+        missing = [voter.voter_number for voter in created if voter.pk is None]
+        if missing:
+            # Backends that cannot return ids from a bulk insert (MySQL).
+            pks = dict(
+                Voter.objects.filter(voter_number__in=missing).values_list("voter_number", "pk")
+            )
+            for voter in created:
+                voter.pk = voter.pk or pks[voter.voter_number]
+        for voter in created:
+            _, digest, active = self._known[voter.voter_number]
+            self._known[voter.voter_number] = (voter.pk, digest, active)
+        self._creates.clear()
+        self._updates.clear()
+
+    def _write_updates(self) -> None:
+        if not self._updates:
+            return
+        # Only rows whose fingerprint changed get here; compare them column by
+        # column so unchanged columns (and updated_at) are left alone.
+        current = {
+            pk: dict(zip(("import_fingerprint", *IMPORT_FIELDS), values))
+            for pk, *values in Voter.objects.filter(pk__in=self._updates)
+            .order_by()
+            .values_list("pk", "import_fingerprint", *IMPORT_FIELDS)
+        }
+        now = timezone.now()
+        by_fields: dict[frozenset, list[Voter]] = defaultdict(list)
+        for pk, values in self._updates.items():
+            changed = {
+                name for name, value in values.items()
+                if name in IMPORT_FIELDS and current[pk][name] != value
+            }
+            if not changed and current[pk]["import_fingerprint"] == values["import_fingerprint"]:
+                # A number repeated in the file ended up back where it started.
+                continue
+            voter = Voter(pk=pk, **{name: values[name] for name in changed})
+            voter.import_fingerprint = values["import_fingerprint"]
+            fields = {"import_fingerprint", *changed}
+            if changed:
+                voter.updated_at = now
+                fields.add("updated_at")
+            by_fields[frozenset(fields)].append(voter)
+        for fields, voters in by_fields.items():
+            Voter.objects.bulk_update(voters, sorted(fields), batch_size=self.batch_size)
+
+    def deactivate_missing(self) -> int:
+        """Deactivate active voters that no row of this import listed.
+
+        The roll loaded at the start, less the numbers seen since, is the
+        set to deactivate; it is written by primary key in batches instead of
+        one ``exclude(voter_number__in=<every number in the file>)``.
+        """
+        self.flush()
+        missing = [
+            pk for number, (pk, _, active) in self._known.items()
+            if active and number not in self._seen
+        ]
+        deactivated = 0
+        for start in range(0, len(missing), self.batch_size):
+            deactivated += Voter.objects.filter(
+                pk__in=missing[start : start + self.batch_size], is_active=True
+            ).update(is_active=False)
+        self.result.deactivated = deactivated
+        return deactivated
+
+
+def file_digest(paths: Iterable[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as handle:
+            digest.update(hashlib.file_digest(handle, "sha256").digest())
+    return digest.hexdigest()
+
+
+def record_manifest(kind: str, paths: list[Path], result: ImportResult) -> ImportManifest:
+    return ImportManifest.objects.create(
+        kind=kind,
+        source=", ".join(str(path) for path in paths),
+        file_digest=file_digest(paths),
+        started_at=timezone.now() - timedelta(seconds=result.elapsed),
+        total_rows=result.total_rows,
+        created=result.created,
+        updated=result.updated,
+        unchanged=result.unchanged,
+        deactivated=result.deactivated,
+        error_count=len(result.errors),
+    )
 
 
 def _extract_arabic_row(row: Iterable):
@@ -58,64 +270,382 @@ def _build_notes(
     return " | ".join(parts)
 
 
+def sheet_names(excel_path: Path) -> list[str]:
+    workbook = load_workbook(excel_path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+# Imports are a generator pipeline: parse -> normalize -> validate -> batch
+# write. Only one batch of rows is ever held, so memory stays flat however
+# long the file is.
+
+CSV_REQUIRED_COLUMNS = {"voter_number", "full_name"}
+
+
+def _parse_csv(csv_path: Path) -> Iterator[dict]:
+    with open(csv_path, newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        missing = CSV_REQUIRED_COLUMNS - set(reader.fieldnames or [])
+        if missing:
+            raise ImportFileError(
+                f"CSV is missing required columns: {', '.join(sorted(missing))}"
+            )
+        yield from reader
+
+
+def _validate_csv(records: Iterable[dict], label: str = "") -> Iterator[ImportRow]:
+    for row_number, row in enumerate(records, start=2):
+        voter_number = (row.get("voter_number") or "").strip()
+        full_name = (row.get("full_name") or "").strip()
+        email = (row.get("email") or "").strip()
+        national_id = (
+            row.get("national_id_number") or row.get("national_id") or row.get("id_number") or ""
+        ).strip()
+        birth_year_raw = (row.get("birth_year") or row.get("birthYear") or "").strip()
+        notes = (row.get("notes") or "").strip()
+
+        if not voter_number or not full_name:
+            yield ImportRow(voter_number, None, [
+                f"{label}Row {row_number}: each row must include both voter_number "
+                "and full_name values, skipped."
+            ])
+            continue
+
+        birth_year = None
+        if birth_year_raw:
+            try:
+                birth_year_int = int(birth_year_raw)
+            except ValueError:
+                yield ImportRow(voter_number, None, [
+                    f"{label}Row {row_number}: invalid birth year {birth_year_raw!r} "
+                    f"for voter {voter_number}, skipped."
+                ])
+                continue
+            if 1900 <= birth_year_int <= 2100:
+                birth_year = birth_year_int
+
+        defaults = {"full_name": full_name, "email": email, "birth_year": birth_year}
+        if national_id:
+            defaults["national_id_number"] = national_id
+        if notes:
+            defaults["notes"] = notes
+        yield ImportRow(voter_number, defaults, [])
+
+
+def _parse_excel(excel_path: Path, sheet_name: str | None) -> Iterator[tuple]:
+    # Read-only mode streams rows from the XML instead of building every cell.
+    workbook = load_workbook(excel_path, read_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        yield from worksheet.iter_rows(min_row=3, values_only=True)
+    finally:
+        workbook.close()
+
+
+def _normalize_excel(rows: Iterable[tuple]) -> Iterator[dict]:
+    for row in rows:
+        # Read-only rows stop at the last non-empty cell when the sheet has
+        # no stored dimensions.
+        if len(row) < ARABIC_COLUMNS:
+            row = (*row, *[None] * (ARABIC_COLUMNS - len(row)))
+        yield _extract_arabic_row(row)
+
+
+def _validate_excel(records: Iterable[dict], label: str = "") -> Iterator[ImportRow]:
+    for row_number, data in enumerate(records, start=3):
+        voter_number = data["voter_number"]
+        if not voter_number:
+            yield ImportRow("", None, [f"{label}Row {row_number}: missing voter number, skipped."])
+            continue
+
+        errors = []
+        full_name = data["full_name"]
+        birth_year_raw = data["birth_year"]
+        birth_year = None
+        if birth_year_raw:
+            try:
+                birth_year = int(birth_year_raw)
+            except (TypeError, ValueError):
+                errors.append(f"{label}Row {row_number}: invalid birth year {birth_year_raw!r}.")
+
+        yield ImportRow(voter_number, {
+            "full_name": full_name or f"Voter {voter_number}",
+            "birth_year": birth_year,
+            "notes": data["notes"],
+            "is_active": True,
+        }, errors)
+
+
+def _rows(kind: str, source: tuple[Path, str | None], label: str) -> Iterator[ImportRow]:
+    path, sheet = source
+    if kind == ImportManifest.Kind.CSV:
+        return _validate_csv(_parse_csv(path), label)
+    return _validate_excel(_normalize_excel(_parse_excel(path, sheet)), label)
+
+
+def _source_batches(kind: str, index: int, source, label: str, batch_size: int):
+    """Yield (source index, rows) per batch of one file or sheet."""
+    rows = _rows(kind, source, label)
+    while batch := list(islice(rows, batch_size)):
+        yield index, batch
+
+
+# A <row> element of a worksheet's XML, with or without a namespace prefix.
+_ROW_TAG = re.compile(rb"<(?:\w+:)?row[\s/>]")
+
+
+def _count_sheet_rows(excel_path: Path, worksheet) -> int | None:
+    """Count the <row> elements in a sheet's XML without parsing a single cell."""
+    # Read-only worksheets know their part in the archive but expose it only
+    # privately.
+    part = getattr(worksheet, "_worksheet_path", None)
+    if part is None:
+        return None
+    count, pending = 0, b""
+    with zipfile.ZipFile(excel_path) as archive, archive.open(part) as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            buffer = pending + chunk
+            # A tag split between two chunks is counted with the next one.
+            cut = max(0, len(buffer) - 32)
+            count += sum(1 for match in _ROW_TAG.finditer(buffer) if match.start() < cut)
+            pending = buffer[cut:]
+    return count + len(_ROW_TAG.findall(pending))
+
+
+def _count_rows(kind: str, source: tuple[Path, str | None]) -> int | None:
+    """Rows a source will yield, for the ETA; cheap, and an estimate for sparse sheets.
+
+    None when the size cannot be told without reading the whole source.
+    """
+    path, sheet = source
+    if kind == ImportManifest.Kind.CSV:
+        lines, chunk = 0, b""
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b""):
+                lines += chunk.count(b"\n")
+        if chunk and not chunk.endswith(b"\n"):
+            lines += 1
+        # Less the header.
+        return max(0, lines - 1)
+    workbook = load_workbook(path, read_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        # Sheets saved without stored dimensions (the rolls we get) report no
+        # max_row; their rows are counted in the XML instead.
+        rows = worksheet.max_row or _count_sheet_rows(path, worksheet)
+        return None if rows is None else max(0, rows - 2)
+    finally:
+        workbook.close()
+
+
+def _source_label(source: tuple[Path, str | None]) -> str:
+    path, sheet = source
+    return f"{Path(path).name} [{sheet}]: " if sheet else f"{Path(path).name}: "
+
+
+def _parse_worker(kind: str, index: int, source, label: str, batch_size: int, queue) -> None:
+    try:
+        for message in _source_batches(kind, index, source, label, batch_size):
+            queue.put(message)
+    finally:
+        # One sentinel per sheet, even when parsing failed.
+        queue.put(None)
+
+
+@contextmanager
+def _parse_pool(kind: str, sources: list, batch_size: int, workers: int):
+    """Start parsing every sheet in a process pool; yields the stream of their batches."""
+    # Forked workers must not inherit open database connections; they never
+    # query, they only parse.
+    connections.close_all()
+    # The manager closes first on the way out, so workers blocked on a full
+    # queue fail fast instead of keeping the pool from shutting down.
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool, Manager() as manager:
+        # Bounded, so fast parsers wait for the writer instead of piling up rows.
+        queue = manager.Queue(maxsize=2 * workers)
+        futures = [
+            pool.submit(_parse_worker, kind, index, source, label, batch_size, queue)
+            for index, (source, label) in enumerate(sources)
+        ]
+
+        def _batches():
+            remaining = len(futures)
+            while remaining:
+                message = queue.get()
+                if message is None:
+                    remaining -= 1
+                else:
+                    yield message
+            for future in futures:
+                future.result()
+
+        yield _batches()
+
+
+def _load_checkpoint(path: Path, digest: str) -> dict:
+    if not path.exists():
+        raise ImportFileError(f"No checkpoint at {path} to resume from.")
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError) as exc:
+        raise ImportFileError(f"Unreadable checkpoint {path}: {exc}") from exc
+    if state.get("digest") != digest:
+        raise ImportFileError(
+            f"Checkpoint {path} was written for different input files. Run without --resume."
+        )
+    return state
+
+
+def _save_checkpoint(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state))
+    os.replace(temp_path, path)
+
+
+def progress_line(result: ImportResult, total: int | None) -> str:
+    """``done/total rows (rate rows/s, ETA h:mm:ss)`` for an import in progress.
+
+    Without a known ``total`` only the rows done and the rate are shown.
+    """
+    rate = result.rows_per_second
+    if total is None:
+        return f"{result.total_rows} rows ({rate:.0f} rows/s)"
+    line = f"{result.total_rows}/{total} rows ({rate:.0f} rows/s"
+    if rate and total > result.total_rows:
+        line += f", ETA {timedelta(seconds=round((total - result.total_rows) / rate))}"
+    return line + ")"
+
+
 def import_voters_from_excel(
     excel_path: Path,
     *,
     sheet_name: str | None = None,
     dry_run: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
 ) -> ImportResult:
-    workbook = load_workbook(excel_path)
-    worksheet = workbook[sheet_name] if sheet_name else workbook.active
+    return import_voters_from_workbooks(
+        [(excel_path, sheet_name)], dry_run=dry_run, batch_size=batch_size
+    )
 
-    result = ImportResult()
 
-    def _apply():
-        nonlocal result
-        for row in worksheet.iter_rows(min_row=3, values_only=True):
-            result.total_rows += 1
-            data = _extract_arabic_row(row)
-
-            voter_number = data["voter_number"]
-            if not voter_number:
-                result.errors.append(
-                    f"Row {result.total_rows + 2}: missing voter number, skipped."
-                )
-                continue
+def import_voters_from_workbooks(
+    sources: list[tuple[Path, str | None]], **options
+) -> ImportResult:
+    """Import several (workbook, sheet) pairs; a sheet of None is the active one."""
+    return run_import(ImportManifest.Kind.EXCEL, sources, **options)
 
-            full_name = data["full_name"]
-            birth_year_raw = data["birth_year"]
-            birth_year = None
-            if birth_year_raw:
-                try:
-                    birth_year = int(birth_year_raw)
-                except (TypeError, ValueError):
-                    result.errors.append(
-                        f"Row {result.total_rows + 2}: invalid birth year {birth_year_raw!r}."
-                    )
-
-            defaults = {
-                "full_name": full_name or f"Voter {voter_number}",
-                "birth_year": birth_year,
-                "notes": data["notes"],
-                "is_active": True,
-            }
 
-            if dry_run:
-                continue
+def run_import(
+    kind: str,
+    sources: list[tuple[Path, str | None]],
+    *,
+    dry_run: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    deactivate_missing: bool = False,
+    checkpoint: Path | None = None,
+    resume: bool = False,
+    error_report: Path | None = None,
+    progress: Callable[[ImportResult, int | None], None] | None = None,
+) -> ImportResult:
+    """Import CSV files or (workbook, sheet) pairs, ``batch_size`` rows per transaction.
 
-            obj, created = Voter.objects.update_or_create(
-                voter_number=voter_number,
-                defaults=defaults,
-            )
-            if created:
-                result.created += 1
-            else:
-                result.updated += 1
+    Each batch commits on its own. After it, ``checkpoint`` records how many
+    rows of each source are done, keyed to the digest of the input files;
+    ``resume`` picks up after the last recorded batch, re-reading the rows
+    before it without writing them. Invalid rows are skipped and their
+    errors appended to ``error_report``; ``progress`` is called after every
+    batch with the result so far and the estimated total row count (None when
+    it cannot be estimated cheaply).
 
-    if dry_run:
-        _apply()
-    else:
-        with transaction.atomic():
-            _apply()
+    With ``workers`` > 1 the sheets are parsed concurrently in a process pool
+    while this process writes their batches as they arrive. A voter listed in
+    two sheets keeps the values of whichever batch is written last. Each run
+    that writes is recorded as an ImportManifest.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    paths = list(dict.fromkeys(Path(path) for path, _ in sources))
+    digest = file_digest(paths)
+    # Error messages name the sheet once there is more than one.
+    labelled = [(source, _source_label(source) if len(sources) > 1 else "") for source in sources]
+    counts = [_count_rows(kind, source) for source in sources]
+    total = None if None in counts else sum(counts)
+
+    offsets: dict[int, int] = {}
+    if resume:
+        if checkpoint is None:
+            raise ImportFileError("Resuming needs a checkpoint file.")
+        state = _load_checkpoint(checkpoint, digest)
+        offsets = {int(index): done for index, done in state["offsets"].items()}
+        for name in CHECKPOINT_COUNTERS:
+            setattr(result, name, state["result"][name])
+        result.resumed_rows = result.total_rows
+        if error_report is not None and error_report.exists():
+            result.errors = error_report.read_text(encoding="utf-8").splitlines()
+    elif error_report is not None:
+        error_report.unlink(missing_ok=True)
+
+    with ExitStack() as stack:
+        if workers > 1 and len(sources) > 1:
+            batches = stack.enter_context(
+                _parse_pool(kind, labelled, batch_size, min(workers, len(sources)))
+            )
+        else:
+            batches = (
+                message
+                for index, (source, label) in enumerate(labelled)
+                for message in _source_batches(kind, index, source, label, batch_size)
+            )
+        writer = None if dry_run else VoterWriter(result, batch_size=batch_size)
+        read = defaultdict(int)
+        for index, rows in batches:
+            errors = []
+            for row in rows:
+                read[index] += 1
+                resumed = read[index] <= offsets.get(index, 0)
+                if not resumed:
+                    result.total_rows += 1
+                    errors.extend(row.errors)
+                if writer is None or not row.voter_number:
+                    continue
+                if resumed or row.values is None:
+                    # Written before the interruption, or rejected: either way
+                    # the voter is listed, so --deactivate-missing keeps them.
+                    writer.skip(row.voter_number)
+                else:
+                    writer.add(row.voter_number, row.values)
+            if writer is not None:
+                writer.flush()
+            if errors:
+                result.errors.extend(errors)
+                if error_report is not None:
+                    error_report.parent.mkdir(parents=True, exist_ok=True)
+                    with open(error_report, "a", encoding="utf-8") as handle:
+                        handle.writelines(f"{error}\n" for error in errors)
+            offsets[index] = max(offsets.get(index, 0), read[index])
+            if writer is not None and checkpoint is not None:
+                _save_checkpoint(checkpoint, {
+                    "digest": digest,
+                    "offsets": offsets,
+                    "result": {name: getattr(result, name) for name in CHECKPOINT_COUNTERS},
+                })
+            result.elapsed = time.perf_counter() - started
+            if progress is not None:
+                progress(result, total)
 
+    if writer is not None:
+        if deactivate_missing:
+            writer.deactivate_missing()
+        result.elapsed = time.perf_counter() - started
+        record_manifest(kind, paths, result)
+        if checkpoint is not None:
+            checkpoint.unlink(missing_ok=True)
+    result.elapsed = time.perf_counter() - started
     return result
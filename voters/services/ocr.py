@@ -1,21 +1,241 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from functools import lru_cache
+from io import BytesIO
 from typing import Iterable, Tuple
 
-import cv2
-import easyocr
 import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image
+
+from voters.services import ocr_cache
+from voters.services.uploads import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# cv2, easyocr and torch are imported inside the functions that use them:
+# together they cost seconds and hundreds of MB per process, and most
+# processes that import this module (migrate, import_voters, web workers
+# talking to an OCR server) never run OCR. Call warm_up() to pay up front.
 
 ARABIC_DIGITS = "٠١٢٣٤٥٦٧٨٩"
 WESTERN_DIGITS = "0123456789"
+DIGIT_ALLOWLIST = WESTERN_DIGITS + ARABIC_DIGITS
+
+# Bump whenever a pipeline change alters OCR output, so cached results from
+# the old pipeline stop matching.
+OCR_PIPELINE_VERSION = "3"
+
+EXIF_ORIENTATION_TAG = 0x0112
+# Orientation probe: how many detected boxes to recognise per candidate angle,
+# and how decisive the winner has to be before we skip the exhaustive search.
+ORIENTATION_PROBE_BOXES = 3
+ORIENTATION_MIN_SCORE = 2.0
+ORIENTATION_MIN_MARGIN = 0.25
+# Share of the detected text area that must agree on a line direction.
+ORIENTATION_MIN_DOMINANCE = 0.7
+# Quality gate: metrics are measured on a copy with this long side so they
+# do not depend on the camera resolution.
+QUALITY_SAMPLE_SIDE = 800
+# Grey levels counted as crushed shadows / blown highlights.
+QUALITY_DARK_LEVEL = 8
+QUALITY_BRIGHT_LEVEL = 247
+# A card outline must cover this share of the frame, with an ID-1 card's
+# aspect ratio (85.6 x 54 mm, about 1.59) give or take perspective.
+QUALITY_CARD_MIN_AREA = 0.2
+QUALITY_CARD_ASPECT = (1.3, 1.9)
+# Canonical (width, height) a registered card is warped to; OCR_FIELD_LAYOUTS
+# regions are fractions of this frame.
+CARD_FRAME = (1000, 630)
+
+
+@dataclass
+class OrientationResult:
+    angle: int
+    method: str
+    confidence: float
+    # Recognition output at ``angle`` when the chosen path already produced it.
+    results: list | None = None
+    # (horizontal_list, free_list) detections valid at ``angle``.
+    detections: tuple[list, list] | None = None
+
+
+@dataclass
+class OCRResult:
+    """Output of the orient/crop stage, in the coordinates of ``image``.
+
+    ``image`` is None when the result came back from the OCR server.
+    """
+
+    image: np.ndarray | None
+    angle: int
+    orientation_method: str
+    # (x_min, y_min, x_max, y_max) of the crop within the rotated image.
+    crop_box: Tuple[int, int, int, int] | None
+    results: list
+    # True when the crop cut through a box and recognition had to run again.
+    reread: bool = False
+    # "full" transcription, "targeted" when only the expected number was read,
+    # "fields" when only the layout's fields were read from the registered
+    # card, or "rejected" when the quality gate stopped the image before OCR.
+    mode: str = "full"
+    text: str = ""
+    # Digits read per layout field in "fields" mode, e.g. {"number": "2006..."}.
+    fields: dict = field(default_factory=dict)
+    # Name of the OCREngine that produced the result.
+    engine: str = "easyocr"
+    # assess_quality() metrics; "problems" holds the reasons for a rejection.
+    quality: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "angle": self.angle,
+            "orientation_method": self.orientation_method,
+            "crop_box": list(self.crop_box) if self.crop_box else None,
+            "results": [
+                [[[int(x), int(y)] for x, y in bbox], text, float(confidence)]
+                for bbox, text, confidence in self.results
+            ],
+            "reread": self.reread,
+            "mode": self.mode,
+            "text": self.text,
+            "fields": self.fields,
+            "quality": self.quality,
+            "engine": self.engine,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OCRResult":
+        crop_box = data.get("crop_box")
+        return cls(
+            image=None,
+            angle=data["angle"],
+            orientation_method=data["orientation_method"],
+            crop_box=tuple(crop_box) if crop_box else None,
+            results=[tuple(item) for item in data["results"]],
+            reread=data.get("reread", False),
+            mode=data.get("mode", "full"),
+            text=data.get("text", ""),
+            fields=data.get("fields", {}),
+            quality=data.get("quality", {}),
+            engine=data.get("engine", "easyocr"),
+        )
+
+
+@dataclass
+class OCRJob:
+    image_path: str
+    processed_path: str | None = None
+    # When set, try a digits-only pass that stops as soon as this number is
+    # read before falling back to full transcription.
+    expected_digits: str = ""
+    # When set and OCR_FIELD_LOCALIZATION is on, read only this document
+    # type's layout fields from the registered card first.
+    document_type: str = ""
+    # Name of a registered OCREngine; empty means OCR_ENGINE.
+    engine: str = ""
+    # The upload's bytes when they are still in memory; decoded instead of
+    # reading image_path. Never sent to the OCR server.
+    data: bytes | None = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "image_path": self.image_path,
+            "processed_path": self.processed_path,
+            "expected_digits": self.expected_digits,
+            "document_type": self.document_type,
+            "engine": self.engine,
+        }
+
+
+class OCRServerError(RuntimeError):
+    """Raised when the OCR server cannot be reached or reports a failure."""
+
+
+# lru_cache lets two threads build the same entry at once; in "threaded" pair
+# mode a cold process would then load two models side by side.
+_reader_lock = threading.Lock()
+
+
+def _get_reader(
+    backend: str = "", quantize: bool | None = None, detection_max_side: int | None = None
+):
+    """The shared reader; arguments left unset come from the OCR_* settings.
+
+    ``detection_max_side`` is kept on the reader for _detect(); when unset
+    the setting is read on every detection pass.
+    """
+    with _reader_lock:
+        return _load_reader(backend, quantize, detection_max_side)
 
 
 @lru_cache(maxsize=1)
-def _get_reader():
+def _load_reader(backend: str, quantize: bool | None, detection_max_side: int | None):
+    import easyocr
+
+    _configure_torch_threads()
     # gpu=False ensures compatibility on servers without GPU support.
-    return easyocr.Reader(["ar", "en"], gpu=False)
+    # quantize=True applies dynamic int8 quantization to the Linear/LSTM
+    # layers, i.e. the recogniser; the CRAFT detector is convolution-only and
+    # stays fp32.
+    if (backend or settings.OCR_BACKEND) == "onnx":
+        from voters.services.ocr_onnx import install_onnx_models
+
+        # The torch networks are only loaded for EasyOCR's label converter and
+        # pre/post-processing; the forward passes go through onnxruntime.
+        reader = easyocr.Reader(["ar", "en"], gpu=False, quantize=False)
+        reader = install_onnx_models(reader, settings.OCR_ONNX_DIR, settings.OCR_TORCH_THREADS)
+    else:
+        if quantize is None:
+            quantize = settings.OCR_QUANTIZE
+        reader = easyocr.Reader(["ar", "en"], gpu=False, quantize=quantize)
+    reader.detection_max_side = detection_max_side
+    return reader
+
+
+_get_reader.cache_clear = _load_reader.cache_clear
+
+
+def _configure_torch_threads() -> None:
+    import torch
+
+    # Several OCR processes per host each default to one thread per core;
+    # cap them so they do not oversubscribe the CPU.
+    if settings.OCR_TORCH_THREADS:
+        torch.set_num_threads(settings.OCR_TORCH_THREADS)
+    if settings.OCR_TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(settings.OCR_TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            # Only allowed before torch starts any inter-op work.
+            logger.warning(
+                "torch inter-op threads already initialised; keeping %s",
+                torch.get_num_interop_threads(),
+            )
+
+
+def warm_up() -> None:
+    """Import the OCR stack, load the models and run one tiny pass.
+
+    Called at boot by processes that will OCR (``manage.py run_ocr_server``,
+    ``manage.py run_ocr_worker``, or WSGI workers with ``OCR_WARM_UP``) so the
+    first upload does not pay for it.
+    """
+    reader = _get_reader()
+    _read_text(np.full((64, 64, 3), 255, dtype=np.uint8), reader)
 
 
 def _rotate_image(image: np.ndarray, angle: int) -> np.ndarray:
+    import cv2
+
     if angle == 0:
         return image
     if angle == 90:
@@ -27,6 +247,27 @@ def _rotate_image(image: np.ndarray, angle: int) -> np.ndarray:
     raise ValueError(f"Unsupported rotation angle: {angle}")
 
 
+def _imread(image_path: str, data: bytes | None = None, flags: int | None = None):
+    """cv2.imread, or cv2.imdecode when the upload is still in memory. Both apply EXIF orientation."""
+    import cv2
+
+    flags = cv2.IMREAD_COLOR if flags is None else flags
+    if data is not None:
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    return cv2.imread(image_path, flags)
+
+
+def _write_image(path: str, image: np.ndarray) -> None:
+    import cv2
+
+    # Encode in memory and rename into place: the processed file may still be
+    # a hard link to the original upload, which an in-place write would clobber.
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1] or ".jpg", image)
+    if not ok:
+        raise ValueError(f"Unable to encode image for {path}")
+    write_atomic(path, encoded.tobytes())
+
+
 def _score_results(results: Iterable[Tuple]) -> float:
     score = 0.0
     for item in results:
@@ -38,58 +279,817 @@ def _score_results(results: Iterable[Tuple]) -> float:
     return score
 
 
-def _auto_orient_and_crop(image_path: str, reader, save_path: str | None = None) -> np.ndarray:
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Unable to read image at {image_path}")
+def _downsample(image: np.ndarray, max_side: int | None = None) -> Tuple[np.ndarray, float]:
+    """Shrink ``image`` to ``max_side`` (default ``OCR_DETECTION_MAX_SIDE``); returns it with the factor back to full size."""
+    import cv2
+
+    if max_side is None:
+        max_side = settings.OCR_DETECTION_MAX_SIDE
+    height, width = image.shape[:2]
+    long_side = max(height, width)
+    if not max_side or long_side <= max_side:
+        return image, 1.0
+    factor = max_side / long_side
+    small = cv2.resize(
+        image,
+        (max(1, round(width * factor)), max(1, round(height * factor))),
+        interpolation=cv2.INTER_AREA,
+    )
+    return small, long_side / max_side
+
+
+def _detect(image: np.ndarray, reader) -> Tuple[list, list]:
+    # Detection cost grows with pixel count, so it runs on the downsampled
+    # copy; boxes are mapped back to full-resolution coordinates.
+    small, scale = _downsample(image, getattr(reader, "detection_max_side", None))
+    horizontal_list, free_list = reader.detect(small)
+    horizontal_list, free_list = horizontal_list[0], free_list[0]
+    if scale != 1.0:
+        horizontal_list = [[int(value * scale) for value in box] for box in horizontal_list]
+        free_list = [
+            [[int(x * scale), int(y * scale)] for x, y in polygon] for polygon in free_list
+        ]
+    return horizontal_list, free_list
+
+
+def _recognize(image: np.ndarray, reader, detections: Tuple[list, list]) -> list:
+    import cv2
 
-    evaluated: list[Tuple[float, np.ndarray, list]] = []
+    horizontal_list, free_list = detections
+    return reader.recognize(
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+        horizontal_list=horizontal_list,
+        free_list=free_list,
+        detail=1,
+    )
+
+
+def _read_text(image: np.ndarray, reader) -> list:
+    """readtext() equivalent: bounded-resolution detection, native-resolution recognition."""
+    return _recognize(image, reader, _detect(image, reader))
+
+
+def _exif_orientation(image_path: str, data: bytes | None = None) -> int:
+    try:
+        with Image.open(BytesIO(data) if data is not None else image_path) as img:
+            return int(img.getexif().get(EXIF_ORIENTATION_TAG, 1) or 1)
+    except Exception:
+        return 1
+
+
+def _box_bounds(horizontal_list: list, free_list: list, shape) -> list[Tuple[int, int, int, int]]:
+    height, width = shape[:2]
+    bounds = []
+    for x_min, x_max, y_min, y_max in horizontal_list:
+        bounds.append((x_min, x_max, y_min, y_max))
+    for polygon in free_list:
+        xs = [point[0] for point in polygon]
+        ys = [point[1] for point in polygon]
+        bounds.append((min(xs), max(xs), min(ys), max(ys)))
+
+    clamped = []
+    for x_min, x_max, y_min, y_max in bounds:
+        x_min, x_max = max(int(x_min), 0), min(int(x_max), width)
+        y_min, y_max = max(int(y_min), 0), min(int(y_max), height)
+        if x_max - x_min > 1 and y_max - y_min > 1:
+            clamped.append((x_min, x_max, y_min, y_max))
+    return clamped
+
+
+def _exhaustive_orientation(image: np.ndarray, reader) -> OrientationResult:
+    evaluated: list[Tuple[float, int, list]] = []
     for angle in (0, 90, 180, 270):
-        rotated = _rotate_image(image, angle)
-        results = reader.readtext(rotated, detail=1, paragraph=False)
-        score = _score_results(results)
-        evaluated.append((score, rotated, results))
+        results = _read_text(_rotate_image(image, angle), reader)
+        evaluated.append((_score_results(results), angle, results))
 
     # Choose orientation with highest OCR confidence/coverage
     evaluated.sort(key=lambda item: item[0], reverse=True)
-    _best_score, best_image, best_results = evaluated[0]
-
-    if best_results:
-        points = []
-        for bbox, text, confidence in best_results:
-            if not text or not text.strip():
-                continue
-            if float(confidence) < 0.2:
-                continue
-            points.extend(bbox)
-
-        if points:
-            coords = np.array(points)
-            min_x = max(int(np.min(coords[:, 0]) - 20), 0)
-            max_x = min(int(np.max(coords[:, 0]) + 20), best_image.shape[1])
-            min_y = max(int(np.min(coords[:, 1]) - 20), 0)
-            max_y = min(int(np.max(coords[:, 1]) + 20), best_image.shape[0])
-            if max_x - min_x > 10 and max_y - min_y > 10:
-                best_image = best_image[min_y:max_y, min_x:max_x]
+    best_score, best_angle, best_results = evaluated[0]
+    runner_up = evaluated[1][0]
+    confidence = (best_score - runner_up) / best_score if best_score else 0.0
+    return OrientationResult(best_angle, "exhaustive", confidence, results=best_results)
+
+
+def _detect_orientation(image: np.ndarray, reader) -> OrientationResult:
+    """Pick the rotation from one detector pass plus a small recognition probe.
+
+    Text lines are wider than they are tall, so the detected box geometry
+    narrows the choice to 0/180 or 90/270; recognising the largest few boxes
+    at both candidates settles it. Anything ambiguous falls back to the
+    exhaustive four-angle search.
+    """
+    import cv2
+
+    horizontal_list, free_list = _detect(image, reader)
+    boxes = _box_bounds(horizontal_list, free_list, image.shape)
+
+    wide_area = sum((x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in boxes if x1 - x0 >= y1 - y0)
+    tall_area = sum((x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in boxes if x1 - x0 < y1 - y0)
+    total_area = wide_area + tall_area
+    if not total_area or max(wide_area, tall_area) / total_area < ORIENTATION_MIN_DOMINANCE:
+        return _exhaustive_orientation(image, reader)
+
+    candidates = (0, 180) if wide_area >= tall_area else (90, 270)
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    probe = sorted(boxes, key=lambda b: (b[1] - b[0]) * (b[3] - b[2]), reverse=True)
+    scores = {angle: 0.0 for angle in candidates}
+    for x_min, x_max, y_min, y_max in probe[:ORIENTATION_PROBE_BOXES]:
+        crop = grey[y_min:y_max, x_min:x_max]
+        for angle in candidates:
+            rotated = _rotate_image(crop, angle)
+            height, width = rotated.shape[:2]
+            results = reader.recognize(
+                rotated, horizontal_list=[[0, width, 0, height]], free_list=[], detail=1
+            )
+            scores[angle] += _score_results(results)
+
+    best_angle, other_angle = sorted(candidates, key=lambda angle: scores[angle], reverse=True)
+    best_score = scores[best_angle]
+    margin = (best_score - scores[other_angle]) / best_score if best_score else 0.0
+    if best_score < ORIENTATION_MIN_SCORE or margin < ORIENTATION_MIN_MARGIN:
+        return _exhaustive_orientation(image, reader)
+
+    detections = (horizontal_list, free_list) if best_angle == 0 else None
+    return OrientationResult(best_angle, "probe", margin, detections=detections)
+
+
+def _crop_to_text(image: np.ndarray, results: list) -> Tuple[int, int, int, int] | None:
+    points = []
+    for bbox, text, confidence in results:
+        if not text or not text.strip():
+            continue
+        if float(confidence) < 0.2:
+            continue
+        points.extend(bbox)
+    return _crop_around(image, points)
+
+
+def _crop_around(image: np.ndarray, points: list) -> Tuple[int, int, int, int] | None:
+    if not points:
+        return None
+    coords = np.array(points)
+    min_x = max(int(np.min(coords[:, 0]) - 20), 0)
+    max_x = min(int(np.max(coords[:, 0]) + 20), image.shape[1])
+    min_y = max(int(np.min(coords[:, 1]) - 20), 0)
+    max_y = min(int(np.max(coords[:, 1]) + 20), image.shape[0])
+    if max_x - min_x > 10 and max_y - min_y > 10:
+        return min_x, min_y, max_x, max_y
+    return None
+
+
+def _results_within(results: list, crop_box, shape) -> list | None:
+    """Shift ``results`` into crop coordinates, or return None if a box straddles the crop edge."""
+    min_x, min_y, max_x, max_y = crop_box
+    height, width = shape[:2]
+    visible = []
+    for bbox, text, confidence in results:
+        xs = [min(max(point[0], 0), width) for point in bbox]
+        ys = [min(max(point[1], 0), height) for point in bbox]
+        inside = min(xs) >= min_x and max(xs) <= max_x and min(ys) >= min_y and max(ys) <= max_y
+        outside = max(xs) <= min_x or min(xs) >= max_x or max(ys) <= min_y or min(ys) >= max_y
+        if inside:
+            shifted = [[point[0] - min_x, point[1] - min_y] for point in bbox]
+            visible.append((shifted, text, confidence))
+        elif not outside:
+            return None
+    return visible
+
+
+def _load_oriented(
+    image_path: str, reader, data: bytes | None = None
+) -> Tuple[np.ndarray, OrientationResult]:
+    # Decoding applies the EXIF orientation tag, so the probe starts from the
+    # camera's own notion of "up".
+    image = _imread(image_path, data)
+    if image is None:
+        raise ValueError(f"Unable to read image at {image_path}")
+
+    orientation = _detect_orientation(image, reader)
+    logger.info(
+        "OCR orientation for %s: angle=%s method=%s confidence=%.2f exif=%s",
+        image_path,
+        orientation.angle,
+        orientation.method,
+        orientation.confidence,
+        _exif_orientation(image_path, data),
+    )
+    return image, orientation
+
+
+def _auto_orient_and_crop(
+    image_path: str, reader, save_path: str | None = None, data: bytes | None = None
+) -> OCRResult:
+    image, orientation = _load_oriented(image_path, reader, data)
+    return _transcribe(image, orientation, reader, save_path)
+
+
+def _transcribe(
+    image: np.ndarray, orientation: OrientationResult, reader, save_path: str | None
+) -> OCRResult:
+    best_image = _rotate_image(image, orientation.angle)
+    best_results = orientation.results
+    if best_results is None and orientation.detections is not None:
+        best_results = _recognize(best_image, reader, orientation.detections)
+    elif best_results is None:
+        best_results = _read_text(best_image, reader)
+
+    result = OCRResult(
+        image=best_image,
+        angle=orientation.angle,
+        orientation_method=orientation.method,
+        crop_box=_crop_to_text(best_image, best_results),
+        results=list(best_results),
+    )
+    if result.crop_box:
+        min_x, min_y, max_x, max_y = result.crop_box
+        visible = _results_within(best_results, result.crop_box, best_image.shape)
+        result.image = best_image[min_y:max_y, min_x:max_x]
+        if visible is None:
+            result.results = _read_text(result.image, reader)
+            result.reread = True
+        else:
+            result.results = visible
 
     if save_path:
-        cv2.imwrite(save_path, best_image)
-    return best_image
+        _write_image(save_path, result.image)
+    return result
 
 
-def extract_text(image_path: str, *, processed_path: str | None = None) -> str:
+def _find_digits_local(
+    image_path: str,
+    expected: str,
+    *,
+    processed_path: str | None = None,
+    data: bytes | None = None,
+) -> OCRResult | None:
+    """Recognise detected boxes digits-only, stopping once ``expected`` is read.
+
+    Returns None when the number never shows up, so the caller can fall back
+    to full transcription.
+    """
+    import cv2
+
     reader = _get_reader()
     try:
-        processed_image = _auto_orient_and_crop(image_path, reader, processed_path)
-    except Exception:
-        processed_image = cv2.imread(image_path)
-        if processed_image is None:
-            return ""
+        image, orientation = _load_oriented(image_path, reader, data)
+    except ValueError:
+        return None
+    if orientation.results is not None:
+        # The exhaustive orientation search already transcribed everything.
+        result = _transcribe(image, orientation, reader, processed_path)
+        result.text = _assemble_text(result.results, reader)
+        return result
+
+    rotated = _rotate_image(image, orientation.angle)
+    horizontal_list, free_list = orientation.detections or _detect(rotated, reader)
+    boxes = [([box], []) for box in horizontal_list] + [([], [polygon]) for polygon in free_list]
+    bounds = _box_bounds(horizontal_list, free_list, rotated.shape)
+    if not boxes:
+        return None
+
+    def _width(item):
+        h_list, f_list = item
+        if h_list:
+            return h_list[0][1] - h_list[0][0]
+        xs = [point[0] for point in f_list[0]]
+        return max(xs) - min(xs)
+
+    # Long digit runs make wide boxes, so the number is usually among the first tried.
+    boxes.sort(key=_width, reverse=True)
+    grey = cv2.cvtColor(rotated, cv2.COLOR_BGR2GRAY)
+    recognized: list = []
+    matched = None
+    for h_list, f_list in boxes:
+        for item in reader.recognize(
+            grey, horizontal_list=h_list, free_list=f_list, detail=1, allowlist=DIGIT_ALLOWLIST
+        ):
+            recognized.append(item)
+            if expected in re.sub(r"\D", "", normalize_digits(item[1])):
+                matched = item
+        if matched:
+            break
+    if matched is None:
+        return None
+
+    points = [[x, y] for x0, x1, y0, y1 in bounds for x, y in ((x0, y0), (x1, y1))]
+    crop_box = _crop_around(rotated, points)
+    processed = rotated
+    if crop_box:
+        min_x, min_y, max_x, max_y = crop_box
+        processed = rotated[min_y:max_y, min_x:max_x]
+        recognized = _results_within(recognized, crop_box, rotated.shape) or []
+    if processed_path:
+        _write_image(processed_path, processed)
+
+    return OCRResult(
+        image=processed,
+        angle=orientation.angle,
+        orientation_method=orientation.method,
+        crop_box=crop_box,
+        results=recognized,
+        mode="targeted",
+        text=matched[1],
+    )
 
-    results = reader.readtext(processed_image, detail=0, paragraph=True)
+
+def _order_corners(corners: np.ndarray) -> np.ndarray:
+    """Sort four corners into top-left, top-right, bottom-right, bottom-left."""
+    sums = corners.sum(axis=1)
+    diffs = np.diff(corners, axis=1).ravel()
+    ordered = np.array(
+        [
+            corners[np.argmin(sums)],
+            corners[np.argmin(diffs)],
+            corners[np.argmax(sums)],
+            corners[np.argmax(diffs)],
+        ],
+        dtype=np.float32,
+    )
+    top_width = np.linalg.norm(ordered[1] - ordered[0])
+    left_height = np.linalg.norm(ordered[3] - ordered[0])
+    if left_height > top_width:
+        # Card photographed upright: rotate the labels so the long edge is on top.
+        ordered = np.roll(ordered, -1, axis=0)
+    return ordered
+
+
+def _register_card(image: np.ndarray) -> np.ndarray | None:
+    """Warp the card onto the canonical CARD_FRAME using its edges, or None if no card is found."""
+    import cv2
+
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = QUALITY_SAMPLE_SIDE / max(grey.shape[:2])
+    small = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else grey
+    _, corners = _find_card(small)
+    if corners is None:
+        return None
+    corners = _order_corners(corners / min(scale, 1.0))
+    width, height = CARD_FRAME
+    target = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+    homography = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(image, homography, CARD_FRAME)
+
+
+def _read_fields(card: np.ndarray, layout: dict, reader) -> tuple[dict, list]:
+    import cv2
+
+    grey = cv2.cvtColor(card, cv2.COLOR_BGR2GRAY)
+    width, height = CARD_FRAME
+    fields, results = {}, []
+    for name, (x0, y0, x1, y1) in layout.items():
+        box = [int(x0 * width), int(x1 * width), int(y0 * height), int(y1 * height)]
+        items = reader.recognize(
+            grey, horizontal_list=[box], free_list=[], detail=1, allowlist=DIGIT_ALLOWLIST
+        )
+        fields[name] = re.sub(r"\D", "", normalize_digits(" ".join(item[1] for item in items)))
+        results.extend(items)
+    return fields, results
+
+
+def _localize_fields(
+    image_path: str,
+    document_type: str,
+    *,
+    processed_path: str | None = None,
+    data: bytes | None = None,
+) -> OCRResult | None:
+    """Read only the layout's fields from the card warped to a canonical frame.
+
+    Returns None when no card outline is found or the number field is empty,
+    so the caller can fall back to the full pipeline.
+    """
+    layout = settings.OCR_FIELD_LAYOUTS.get(document_type)
+    if not layout:
+        return None
+    image = _imread(image_path, data)
+    if image is None:
+        return None
+    card = _register_card(image)
+    if card is None:
+        return None
+
+    reader = _get_reader()
+    best = None
+    # Edges fix the card up to a half turn; read both ways, keep the stronger.
+    for angle in (0, 180):
+        fields, results = _read_fields(_rotate_image(card, angle), layout, reader)
+        score = _score_results(results)
+        if best is None or score > best[0]:
+            best = (score, angle, fields, results)
+    _, angle, fields, results = best
+    if not fields.get("number"):
+        return None
+
+    processed = _rotate_image(card, angle)
+    if processed_path:
+        _write_image(processed_path, processed)
+    return OCRResult(
+        image=processed,
+        angle=angle,
+        orientation_method="card-edges",
+        crop_box=None,
+        results=results,
+        mode="fields",
+        text=" ".join(fields.values()),
+        fields=fields,
+    )
+
+
+def _assemble_text(results: list, reader) -> str:
+    from easyocr.utils import get_paragraph
+
+    # Same grouping readtext(paragraph=True) applies, without a second inference.
     if not results:
-        results = reader.readtext(processed_image, detail=0, paragraph=False)
-    return "\n".join(results)
+        return ""
+    mode = "rtl" if getattr(reader, "model_lang", "") == "arabic" else "ltr"
+    paragraphs = get_paragraph(results, x_ths=1.0, y_ths=0.5, mode=mode)
+    return "\n".join(text for _bbox, text in paragraphs)
+
+
+def _request_ocr_server(payload: dict) -> dict:
+    socket_path = settings.OCR_SERVER_SOCKET
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(settings.OCR_SERVER_TIMEOUT)
+        try:
+            conn.connect(socket_path)
+            conn.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            with conn.makefile("rb") as stream:
+                line = stream.readline()
+        except OSError as exc:
+            raise OCRServerError(f"OCR server unavailable at {socket_path}: {exc}") from exc
+
+    if not line:
+        raise OCRServerError("OCR server closed the connection without a reply.")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise OCRServerError(response.get("error") or "OCR server failed.")
+    return response
+
+
+def pipeline_version() -> str:
+    if settings.OCR_BACKEND == "onnx":
+        precision = "onnx"
+    else:
+        precision = "int8" if settings.OCR_QUANTIZE else "fp32"
+    return f"{OCR_PIPELINE_VERSION}:{settings.OCR_DETECTION_MAX_SIDE}:{precision}"
+
+
+def _cache_key(image_path: str, engine: str = "", data: bytes | None = None) -> str:
+    if data is not None:
+        content_hash = hashlib.sha256(data).hexdigest()
+    else:
+        with open(image_path, "rb") as handle:
+            content_hash = hashlib.file_digest(handle, "sha256").hexdigest()
+    version = f"{pipeline_version()}:{engine or settings.OCR_ENGINE}"
+    return hashlib.sha256(f"{version}:{content_hash}".encode()).hexdigest()
+
+
+def _restore_cached(
+    image_path: str, payload: dict, processed_path: str | None, data: bytes | None = None
+) -> OCRResult:
+    # Rebuild the processed image from the stored angle and crop instead of
+    # running the pipeline again.
+    result = OCRResult.from_dict(payload)
+    if processed_path:
+        image = _imread(image_path, data)
+        if image is not None:
+            image = _rotate_image(image, result.angle)
+            if result.crop_box:
+                min_x, min_y, max_x, max_y = result.crop_box
+                image = image[min_y:max_y, min_x:max_x]
+            _write_image(processed_path, image)
+            result.image = image
+    return result
+
+
+def read_document(
+    image_path: str, *, processed_path: str | None = None, expected_digits: str = ""
+) -> OCRResult | None:
+    """Orient, crop and recognise ``image_path``; None if the file cannot be decoded.
+
+    Runs in-process unless ``OCR_SERVER_SOCKET`` points at ``run_ocr_server``.
+    """
+    return read_documents([OCRJob(image_path, processed_path, expected_digits)])[0]
+
+
+def read_documents(
+    jobs: list[OCRJob], *, batch: bool = False, use_cache: bool = True
+) -> list[OCRResult | None]:
+    """Read several images as one job.
+
+    Cached results are served first, unless ``use_cache`` is False, in which
+    case every image is read again and its cache entry refreshed. Remaining
+    images run on a small thread pool, or with ``batch`` and an OCR server, as
+    a single request the server spreads over its inference workers. The cache
+    is only touched from the calling thread, and only full transcriptions are
+    stored in it.
+    """
+    keys = [
+        _cache_key(job.image_path, job.engine, job.data) if settings.OCR_CACHE_ENABLED else None
+        for job in jobs
+    ]
+    results: list[OCRResult | None] = [None] * len(jobs)
+    misses = []
+    for index, (job, key) in enumerate(zip(jobs, keys)):
+        payload = ocr_cache.lookup(key) if key and use_cache else None
+        if payload is not None:
+            results[index] = _restore_cached(
+                job.image_path, payload, job.processed_path, job.data
+            )
+        else:
+            misses.append(index)
+
+    pending = [jobs[index] for index in misses]
+    if not pending:
+        fetched = []
+    elif batch and settings.OCR_SERVER_SOCKET:
+        response = _request_ocr_server({"batch": [job.to_dict() for job in pending]})
+        fetched = [OCRResult.from_dict(item) if item else None for item in response["results"]]
+    elif len(pending) == 1:
+        fetched = [_read_uncached(pending[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            fetched = list(pool.map(_read_uncached, pending))
+
+    for index, result in zip(misses, fetched):
+        results[index] = result
+        if result is not None and result.mode == "full" and keys[index]:
+            ocr_cache.store(keys[index], result.to_dict())
+    return results
+
+
+def _read_uncached(job: OCRJob) -> OCRResult | None:
+    if settings.OCR_SERVER_SOCKET:
+        result = _request_ocr_server(job.to_dict()).get("result")
+        return OCRResult.from_dict(result) if result else None
+    return run_job_locally(job)
+
+
+def _find_card(grey: np.ndarray) -> tuple[float, np.ndarray | None]:
+    """Largest card-shaped quadrilateral: its share of the frame and its 4 corners."""
+    import cv2
+
+    edges = cv2.Canny(cv2.GaussianBlur(grey, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, None)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    frame_area = grey.shape[0] * grey.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area = cv2.contourArea(contour)
+        if area < QUALITY_CARD_MIN_AREA * frame_area:
+            break
+        outline = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(outline) != 4 or not cv2.isContourConvex(outline):
+            continue
+        (_, _), (width, height), _ = cv2.minAreaRect(outline)
+        aspect = max(width, height) / max(1.0, min(width, height))
+        if QUALITY_CARD_ASPECT[0] <= aspect <= QUALITY_CARD_ASPECT[1]:
+            return area / frame_area, outline.reshape(4, 2).astype(np.float32)
+    return 0.0, None
+
+
+def assess_quality(image_path: str, data: bytes | None = None) -> dict | None:
+    """Millisecond-scale blur, exposure, resolution and card-outline checks.
+
+    Returns the metrics with a list of Arabic "problems" (empty when the image
+    is worth running OCR on), or None when the file cannot be decoded.
+    """
+    import cv2
+
+    try:
+        with Image.open(BytesIO(data) if data is not None else image_path) as img:
+            width, height = img.size
+    except Exception:
+        return None
+    # Decoding at half size is much cheaper and plenty for these statistics.
+    grey = _imread(image_path, data, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if grey is None:
+        return None
+    scale = QUALITY_SAMPLE_SIDE / max(grey.shape[:2])
+    if scale < 1:
+        grey = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    histogram = cv2.calcHist([grey], [0], None, [256], [0, 256]).ravel() / grey.size
+    metrics = {
+        "width": width,
+        "height": height,
+        "sharpness": round(float(cv2.Laplacian(grey, cv2.CV_64F).var()), 1),
+        "brightness": round(float(grey.mean()), 1),
+        "dark_fraction": round(float(histogram[: QUALITY_DARK_LEVEL + 1].sum()), 3),
+        "bright_fraction": round(float(histogram[QUALITY_BRIGHT_LEVEL:].sum()), 3),
+        "card_area": round(_find_card(grey)[0], 3),
+    }
+
+    problems = []
+    if min(width, height) < settings.OCR_QUALITY_MIN_SIDE:
+        problems.append(
+            f"دقة الصورة منخفضة جدًا ({width}×{height})، يرجى التقاط صورة أقرب وبدقة أعلى."
+        )
+    if metrics["sharpness"] < settings.OCR_QUALITY_MIN_SHARPNESS:
+        problems.append("الصورة غير واضحة (مهزوزة أو خارج التركيز)، يرجى إعادة التصوير مع تثبيت الكاميرا.")
+    if (
+        metrics["brightness"] < settings.OCR_QUALITY_MIN_BRIGHTNESS
+        or metrics["dark_fraction"] > settings.OCR_QUALITY_MAX_CLIPPED
+    ):
+        problems.append("الصورة مظلمة جدًا، يرجى التصوير في إضاءة أفضل.")
+    elif (
+        metrics["brightness"] > settings.OCR_QUALITY_MAX_BRIGHTNESS
+        or metrics["bright_fraction"] > settings.OCR_QUALITY_MAX_CLIPPED
+    ):
+        problems.append("الصورة ساطعة جدًا أو بها انعكاس قوي، يرجى تجنب الفلاش والإضاءة المباشرة.")
+    if settings.OCR_QUALITY_REQUIRE_CARD and not metrics["card_area"]:
+        problems.append(
+            "لم يتم العثور على حواف البطاقة، يرجى تصوير البطاقة كاملة على خلفية مختلفة اللون."
+        )
+    metrics["problems"] = problems
+    return metrics
+
+
+class OCREngine:
+    """Turns one OCRJob into an OCRResult; register instances with register_engine()."""
+
+    name = ""
+
+    def read(self, job: OCRJob) -> OCRResult | None:
+        raise NotImplementedError
+
+
+class EasyOCREngine(OCREngine):
+    """The full pipeline: field localization, targeted digits, then full transcription."""
+
+    name = "easyocr"
+
+    def read(self, job: OCRJob) -> OCRResult | None:
+        result = None
+        if settings.OCR_FIELD_LOCALIZATION and job.document_type:
+            result = _localize_fields(
+                job.image_path,
+                job.document_type,
+                processed_path=job.processed_path,
+                data=job.data,
+            )
+        if result is None and job.expected_digits:
+            result = _find_digits_local(
+                job.image_path,
+                job.expected_digits,
+                processed_path=job.processed_path,
+                data=job.data,
+            )
+        if result is None:
+            result = _read_document_local(
+                job.image_path, processed_path=job.processed_path, data=job.data
+            )
+        return result
+
+
+class TesseractDigitsEngine(OCREngine):
+    """Tesseract restricted to digits: far cheaper than EasyOCR, and all the
+    document checks need when the number is printed cleanly.
+
+    Needs the ``pytesseract`` package and the ``tesseract`` binary.
+    """
+
+    name = "tesseract"
+    config = "--psm 11 -c tessedit_char_whitelist=0123456789"
+    # Stop rotating once a digit run this long is read.
+    min_digits = 8
+
+    def read(self, job: OCRJob) -> OCRResult | None:
+        import cv2
+
+        try:
+            import pytesseract
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "The tesseract OCR engine requires pytesseract and the tesseract binary."
+            ) from exc
+
+        image = _imread(job.image_path, job.data)
+        if image is None:
+            return None
+        best = None
+        for angle in (0, 180, 90, 270):
+            rotated = _rotate_image(image, angle)
+            boxes = pytesseract.image_to_data(
+                cv2.cvtColor(rotated, cv2.COLOR_BGR2GRAY),
+                config=self.config,
+                output_type=pytesseract.Output.DICT,
+            )
+            results = [
+                (
+                    [[left, top], [left + width, top], [left + width, top + height], [left, top + height]],
+                    text.strip(),
+                    max(float(conf), 0.0) / 100,
+                )
+                for left, top, width, height, text, conf in zip(
+                    boxes["left"], boxes["top"], boxes["width"], boxes["height"], boxes["text"], boxes["conf"]
+                )
+                if text.strip()
+            ]
+            if best is None or _score_results(results) > _score_results(best[1]):
+                best = (angle, results)
+            if any(len(text) >= self.min_digits for _, text, _ in results):
+                break
+
+        angle, results = best
+        processed = _rotate_image(image, angle)
+        if job.processed_path:
+            _write_image(job.processed_path, processed)
+        return OCRResult(
+            image=processed,
+            angle=angle,
+            orientation_method="tesseract",
+            crop_box=None,
+            results=results,
+            text=" ".join(text for _, text, _ in results),
+            engine=self.name,
+        )
+
+
+class StubEngine(OCREngine):
+    """In-memory engine for tests: canned text per image path, no models.
+
+    Not registered by default; tests add it to ENGINES themselves.
+    """
+
+    name = "stub"
+
+    def __init__(self, texts: dict[str, str] | None = None, default: str = ""):
+        self.texts = texts or {}
+        self.default = default
+        self.jobs: list[OCRJob] = []
+
+    def read(self, job: OCRJob) -> OCRResult | None:
+        self.jobs.append(job)
+        text = self.texts.get(job.image_path, self.default)
+        return OCRResult(None, 0, "none", None, [], text=text, engine=self.name)
+
+
+ENGINES: dict[str, OCREngine] = {}
+
+
+def register_engine(engine: OCREngine) -> OCREngine:
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name: str = "") -> OCREngine:
+    name = name or settings.OCR_ENGINE
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown OCR engine {name!r}; registered: {', '.join(sorted(ENGINES))}."
+        ) from None
+
+
+for _engine in (EasyOCREngine(), TesseractDigitsEngine()):
+    register_engine(_engine)
+
+
+def engines_for(document_type: str) -> list[str]:
+    """Engine cascade for a document type: cheapest first, OCR_ENGINE by default."""
+    return list(settings.OCR_ENGINES.get(document_type) or [settings.OCR_ENGINE])
+
+
+def run_job_locally(job: OCRJob) -> OCRResult | None:
+    quality = assess_quality(job.image_path, job.data) or {}
+    if settings.OCR_QUALITY_GATE and quality.get("problems"):
+        # Hopeless photo: skip every model pass and tell the voter why.
+        return OCRResult(None, 0, "none", None, [], mode="rejected", quality=quality)
+
+    result = get_engine(job.engine).read(job)
+    if result is not None:
+        result.quality = quality
+    return result
+
+
+def _read_document_local(
+    image_path: str,
+    *,
+    processed_path: str | None = None,
+    data: bytes | None = None,
+    reader=None,
+) -> OCRResult | None:
+    reader = reader or _get_reader()
+    try:
+        result = _auto_orient_and_crop(image_path, reader, processed_path, data)
+    except Exception:
+        image = _imread(image_path, data)
+        if image is None:
+            return None
+        result = OCRResult(image, 0, "none", None, _read_text(image, reader))
+
+    result.text = _assemble_text(result.results, reader)
+    return result
+
+
+def extract_text(image_path: str, *, processed_path: str | None = None) -> str:
+    result = read_document(image_path, processed_path=processed_path)
+    return result.text if result else ""
+
+
+def extract_texts(jobs: list[OCRJob], *, batch: bool = False) -> list[str]:
+    return [result.text if result else "" for result in read_documents(jobs, batch=batch)]
 
 
 def normalize_digits(text: str) -> str:
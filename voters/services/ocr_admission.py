@@ -0,0 +1,140 @@
+"""Host-wide cap on concurrent OCR, shared by every process on the machine.
+
+Each of the ``OCR_MAX_INFLIGHT`` slots is a file under ``OCR_ADMISSION_DIR``
+held with an exclusive ``flock``; the kernel drops the lock when its holder
+exits, so a crashed worker never leaks a slot.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from voters.models import ValidationJob
+
+SLOT_POLL_INTERVAL = 0.2
+
+
+def _slot_paths() -> list[Path]:
+    directory = Path(settings.OCR_ADMISSION_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    return [directory / f"slot-{index}.lock" for index in range(settings.OCR_MAX_INFLIGHT)]
+
+
+def _try_lock(path: Path, mode: int):
+    handle = open(path, "a")
+    try:
+        fcntl.flock(handle, mode | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+def _acquire(wait: float):
+    deadline = time.monotonic() + wait
+    while True:
+        for path in _slot_paths():
+            handle = _try_lock(path, fcntl.LOCK_EX)
+            if handle is not None:
+                return handle
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+@contextmanager
+def ocr_slot(*, wait: float = 0):
+    """Hold one OCR slot for the block; yields False if none freed up within ``wait`` seconds.
+
+    Always admits when ``OCR_MAX_INFLIGHT`` is 0.
+    """
+    if not settings.OCR_MAX_INFLIGHT:
+        yield True
+        return
+    handle = _acquire(wait)
+    if handle is None:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+def _flocked_files() -> set[tuple[int, int, int]] | None:
+    """(major, minor, inode) of every file with an exclusive flock, from /proc/locks."""
+    try:
+        with open("/proc/locks") as handle:
+            lines = handle.read().splitlines()
+    except OSError:
+        return None
+    held = set()
+    for line in lines:
+        # "1: FLOCK  ADVISORY  WRITE <pid> fe:00:<inode> 0 EOF"; waiters
+        # queued behind a lock are listed as "1: -> FLOCK ...".
+        fields = line.split()
+        if len(fields) >= 6 and fields[1] == "FLOCK" and fields[3] == "WRITE":
+            major, minor, inode = fields[5].split(":")
+            held.add((int(major, 16), int(minor, 16), int(inode)))
+    return held
+
+
+def inflight() -> int:
+    """How many slots are currently held, read without locking any of them."""
+    if not settings.OCR_MAX_INFLIGHT:
+        return 0
+    held_files = _flocked_files()
+    held = 0
+    for path in _slot_paths():
+        if held_files is not None:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Never taken yet.
+                continue
+            held += (os.major(stat.st_dev), os.minor(stat.st_dev), stat.st_ino) in held_files
+            continue
+        # No /proc/locks: probe with a non-blocking lock released at once.
+        # It can briefly turn away an ocr_slot() racing for the same file, so
+        # it is only used for this report.
+        handle = _try_lock(path, fcntl.LOCK_EX)
+        if handle is None:
+            held += 1
+        else:
+            handle.close()
+    return held
+
+
+def queue_position(job: ValidationJob) -> int:
+    """1-based place of ``job`` among the jobs still waiting for a worker."""
+    return ValidationJob.objects.filter(
+        status=ValidationJob.Status.QUEUED, pk__lte=job.pk
+    ).count()
+
+
+def stats() -> dict:
+    now = timezone.now()
+    waiting = ValidationJob.objects.filter(status=ValidationJob.Status.QUEUED)
+    oldest = waiting.order_by("created_at").values_list("created_at", flat=True).first()
+    recent_waits = [
+        (started_at - created_at).total_seconds()
+        for created_at, started_at in ValidationJob.objects.filter(
+            started_at__gte=now - timedelta(hours=1)
+        ).values_list("created_at", "started_at")
+    ]
+    return {
+        "limit": settings.OCR_MAX_INFLIGHT,
+        "inflight": inflight(),
+        "queued": waiting.count(),
+        "oldest_wait": (now - oldest).total_seconds() if oldest else 0,
+        "average_wait": sum(recent_waits) / len(recent_waits) if recent_waits else 0,
+    }
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import Now
+
+from voters.models import OCRCacheEntry
+
+
+def lookup(key: str) -> dict | None:
+    entry = OCRCacheEntry.objects.filter(key=key).only("pk", "payload").first()
+    if entry is None:
+        return None
+    OCRCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=Now(), hits=F("hits") + 1)
+    return entry.payload
+
+
+def store(key: str, payload: dict) -> None:
+    try:
+        OCRCacheEntry.objects.update_or_create(key=key, defaults={"payload": payload})
+    except IntegrityError:
+        # Another worker cached the same image first.
+        return
+    evict()
+
+
+def evict(max_entries: int | None = None) -> int:
+    """Drop least recently used entries beyond ``max_entries``; returns how many."""
+    if max_entries is None:
+        max_entries = settings.OCR_CACHE_MAX_ENTRIES
+    excess = OCRCacheEntry.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+    stale = OCRCacheEntry.objects.order_by("last_used_at").values_list("pk", flat=True)[:excess]
+    deleted, _ = OCRCacheEntry.objects.filter(pk__in=list(stale)).delete()
+    return deleted
+
+
+def clear() -> int:
+    deleted, _ = OCRCacheEntry.objects.all().delete()
+    return deleted
+
+
+def stats() -> dict:
+    return OCRCacheEntry.objects.aggregate(
+        total_hits=Sum("hits"),
+        oldest=Min("created_at"),
+        last_used=Max("last_used_at"),
+    ) | {"entries": OCRCacheEntry.objects.count(), "max_entries": settings.OCR_CACHE_MAX_ENTRIES}
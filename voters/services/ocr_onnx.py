@@ -0,0 +1,134 @@
+"""ONNX Runtime stand-ins for EasyOCR's torch detector and recogniser.
+
+EasyOCR keeps doing all pre- and post-processing; only the two network
+forward passes run through onnxruntime, so ``readtext``-shaped output is
+unchanged for the rest of the pipeline.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import torch
+from django.core.exceptions import ImproperlyConfigured
+
+DETECTOR_FILENAME = "detector.onnx"
+RECOGNIZER_FILENAME = "recognizer.onnx"
+ONNX_OPSET = 17
+
+
+def _onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as exc:
+        raise ImproperlyConfigured(
+            "OCR_BACKEND=onnx requires the onnxruntime package (pip install onnxruntime)."
+        ) from exc
+    return onnxruntime
+
+
+def _session(path: Path, threads: int):
+    onnxruntime = _onnxruntime()
+    if not path.exists():
+        raise ImproperlyConfigured(
+            f"Missing ONNX model {path}. Run `python manage.py export_ocr_onnx` first."
+        )
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return onnxruntime.InferenceSession(
+        str(path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+class OnnxDetector:
+    """Called by easyocr like the CRAFT module: ``y, feature = net(x)``."""
+
+    def __init__(self, path: Path, threads: int = 0):
+        self.session = _session(path, threads)
+
+    def eval(self):
+        return self
+
+    def __call__(self, image: torch.Tensor):
+        y, feature = self.session.run(None, {"image": image.cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+
+class OnnxRecognizer:
+    """Called by easyocr like the CRNN module: ``preds = model(image, text)``."""
+
+    def __init__(self, path: Path, threads: int = 0):
+        self.session = _session(path, threads)
+
+    def eval(self):
+        return self
+
+    def __call__(self, image: torch.Tensor, text=None):
+        (preds,) = self.session.run(None, {"image": image.cpu().numpy()})
+        return torch.from_numpy(preds)
+
+
+class _ExportableRecognizer(torch.nn.Module):
+    """EasyOCR's recogniser forward pass with ONNX-friendly pooling.
+
+    ``AdaptiveAvgPool2d((None, 1))`` followed by ``squeeze(3)`` is a mean over
+    the last axis; written that way the width axis can stay dynamic.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        visual_feature = self.model.FeatureExtraction(image).permute(0, 3, 1, 2).mean(dim=3)
+        contextual_feature = self.model.SequenceModeling(visual_feature)
+        return self.model.Prediction(contextual_feature.contiguous())
+
+
+def export_models(reader, output_dir: Path) -> list[Path]:
+    """Export an unquantized reader's detector and recogniser to ``output_dir``."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    detector_path = output_dir / DETECTOR_FILENAME
+    recognizer_path = output_dir / RECOGNIZER_FILENAME
+
+    with torch.no_grad():
+        torch.onnx.export(
+            reader.detector.eval(),
+            (torch.randn(1, 3, 320, 480),),
+            str(detector_path),
+            input_names=["image"],
+            output_names=["y", "feature"],
+            dynamic_axes={
+                "image": {0: "batch", 2: "height", 3: "width"},
+                "y": {0: "batch", 1: "score_height", 2: "score_width"},
+                "feature": {0: "batch", 2: "feature_height", 3: "feature_width"},
+            },
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+        _export_recognizer(reader.recognizer, recognizer_path)
+    return [detector_path, recognizer_path]
+
+
+def _export_recognizer(recognizer: torch.nn.Module, path: Path) -> None:
+    torch.onnx.export(
+        _ExportableRecognizer(recognizer).eval(),
+        (torch.randn(1, 1, 64, 256),),
+        str(path),
+        input_names=["image"],
+        output_names=["preds"],
+        dynamic_axes={
+            "image": {0: "batch", 3: "width"},
+            "preds": {0: "batch", 1: "steps"},
+        },
+        opset_version=ONNX_OPSET,
+        dynamo=False,
+    )
+
+
+def install_onnx_models(reader, model_dir: Path, threads: int = 0):
+    """Swap ``reader``'s torch networks for ONNX Runtime sessions."""
+    reader.detector = OnnxDetector(model_dir / DETECTOR_FILENAME, threads)
+    reader.recognizer = OnnxRecognizer(model_dir / RECOGNIZER_FILENAME, threads)
+    return reader
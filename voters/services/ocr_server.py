@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from voters.services.ocr import OCRJob, run_job_locally, warm_up
+
+logger = logging.getLogger(__name__)
+
+
+class OCRRequestHandler(socketserver.StreamRequestHandler):
+    """Handles one newline-delimited JSON request per connection."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            if "batch" in request:
+                with ThreadPoolExecutor(max_workers=max(1, len(request["batch"]))) as pool:
+                    results = list(pool.map(self._read, request["batch"]))
+                response = {"ok": True, "results": results}
+            else:
+                response = {"ok": True, "result": self._read(request)}
+        except Exception as exc:
+            logger.exception("OCR request failed")
+            response = {"ok": False, "error": str(exc)}
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def _read(self, item: dict) -> dict | None:
+        job = OCRJob(
+            item["image_path"],
+            item.get("processed_path"),
+            item.get("expected_digits", ""),
+            item.get("document_type", ""),
+            item.get("engine", ""),
+        )
+        with self.server.slots:
+            result = run_job_locally(job)
+        return result.to_dict() if result else None
+
+
+class OCRServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves OCR over a Unix socket from a single shared EasyOCR reader.
+
+    Connections are accepted on their own threads; ``workers`` bounds how many
+    of them run inference at once. torch releases the GIL during inference,
+    so the threads share one copy of the model.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, workers: int):
+        self.socket_path = socket_path
+        self.slots = threading.BoundedSemaphore(max(1, workers))
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, OCRRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def create_server(socket_path: str, workers: int) -> OCRServer:
+    # Load the model before accepting connections so no request pays for it.
+    warm_up()
+    return OCRServer(socket_path, workers)
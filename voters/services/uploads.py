@@ -0,0 +1,87 @@
+"""Storing uploaded document photos with as little disk I/O as possible.
+
+Each upload is written once, as the ``original_*`` file. The ``new_*`` file
+a document points at starts out as a hard link to it, so no bytes are copied;
+OCR later swaps in the processed image with an atomic rename, which leaves
+the original untouched.
+"""
+
+from __future__ import annotations
+
+import os
+import secrets
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Replace ``path`` with ``data`` so readers see the old or new file, never half of one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(data)
+        os.chmod(temp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def _temp_name(target: str) -> str:
+    return f"{target}.{secrets.token_hex(4)}.tmp"
+
+
+def _link(source: str, target: str) -> None:
+    temp_path = _temp_name(target)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        # No hard links on this filesystem: fall back to a copy.
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+
+
+def _move(source: str, target: str) -> None:
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.replace(source, target)
+    except OSError:
+        # FILE_UPLOAD_TEMP_DIR is on another filesystem.
+        temp_path = _temp_name(target)
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+    os.chmod(target, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+
+
+def save_upload(uploaded_file, original_name: str, processed_name: str) -> bytes | None:
+    """Store ``uploaded_file`` under both storage names, overwriting earlier uploads.
+
+    Returns the file's bytes when the upload handler kept it in memory, so OCR
+    can decode them instead of reading the file back; None when it was spooled
+    to a temporary file, which is moved into place rather than copied.
+    """
+    original_path = default_storage.path(original_name)
+    data = None
+    if hasattr(uploaded_file, "temporary_file_path"):
+        _move(uploaded_file.temporary_file_path(), original_path)
+    else:
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        write_atomic(original_path, data)
+    _link(original_path, default_storage.path(processed_name))
+    return data
+
+
+def original_path(processed_path: str) -> str | None:
+    """The untouched upload stored next to a document's processed image, if it still exists."""
+    processed = Path(processed_path)
+    original = processed.with_name(processed.name.replace("new_", "original_", 1))
+    if original != processed and original.exists():
+        return str(original)
+    return None
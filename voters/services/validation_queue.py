@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from voters.models import IDDocument, ValidationJob
+from voters.services.document_checks import mark_documents_failed, process_document_pair
+from voters.services.ocr_admission import ocr_slot
+
+logger = logging.getLogger(__name__)
+
+# How many claimable jobs one claim attempt looks at before giving up the race.
+CLAIM_CANDIDATES = 5
+
+
+def enqueue_pair(national_doc: IDDocument, voter_doc: IDDocument) -> ValidationJob:
+    """Mark both documents pending and queue them for a worker to validate."""
+    documents = (national_doc, voter_doc)
+    IDDocument.objects.filter(pk__in=[doc.pk for doc in documents]).update(
+        validation_status="pending", validation_errors=""
+    )
+    for document in documents:
+        document.validation_status = "pending"
+        document.validation_errors = ""
+    return ValidationJob.objects.create(
+        voter=national_doc.voter,
+        national_document=national_doc,
+        voter_card_document=voter_doc,
+        run_after=timezone.now(),
+    )
+
+
+def _claimable(now):
+    return ValidationJob.objects.filter(
+        Q(status=ValidationJob.Status.QUEUED, run_after__lte=now)
+        | Q(status=ValidationJob.Status.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim(worker_id: str) -> ValidationJob | None:
+    """Lease the next due job to ``worker_id``, or return None when there is none.
+
+    Jobs are taken with a conditional UPDATE, so concurrent workers (threads or
+    processes, on any database backend) never claim the same job. Running jobs
+    whose lease has expired are claimable again, which is how jobs held by a
+    crashed worker get picked back up.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.OCR_WORKER_VISIBILITY_TIMEOUT)
+    candidates = list(_claimable(now).values_list("pk", flat=True)[:CLAIM_CANDIDATES])
+    for pk in candidates:
+        claimed = _claimable(now).filter(pk=pk).update(
+            status=ValidationJob.Status.RUNNING,
+            locked_until=lease,
+            locked_by=worker_id,
+            started_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return ValidationJob.objects.select_related(
+                "national_document__voter", "voter_card_document__voter"
+            ).get(pk=pk)
+    return None
+
+
+def run_job(job: ValidationJob) -> None:
+    if job.attempts > settings.OCR_WORKER_MAX_ATTEMPTS:
+        # The previous holder's lease ran out on the last allowed attempt.
+        _give_up(job, job.last_error or "انتهت مهلة معالجة الوثائق.")
+        return
+
+    try:
+        process_document_pair(job.national_document, job.voter_card_document)
+    except Exception as exc:
+        logger.exception("Validation job %s failed (attempt %s)", job.pk, job.attempts)
+        if job.attempts >= settings.OCR_WORKER_MAX_ATTEMPTS:
+            _give_up(job, str(exc))
+        else:
+            delay = settings.OCR_WORKER_RETRY_DELAY * 2 ** (job.attempts - 1)
+            _release(
+                job,
+                status=ValidationJob.Status.QUEUED,
+                run_after=timezone.now() + timedelta(seconds=delay),
+                last_error=str(exc),
+            )
+        return
+
+    _release(job, status=ValidationJob.Status.DONE, finished_at=timezone.now())
+
+
+def _give_up(job: ValidationJob, error: str) -> None:
+    mark_documents_failed(
+        [job.national_document, job.voter_card_document],
+        f"تعذر التحقق من الوثائق آليًا: {error}",
+    )
+    _release(
+        job,
+        status=ValidationJob.Status.FAILED,
+        last_error=error,
+        finished_at=timezone.now(),
+    )
+
+
+def _release(job: ValidationJob, **fields) -> None:
+    # Only the current lease holder may settle the job; if the lease expired
+    # and another worker took over, that worker's outcome wins.
+    ValidationJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        locked_until=None, **fields
+    )
+
+
+def work(worker_id: str, stop: threading.Event, *, once: bool = False) -> int:
+    """Claim and run jobs until ``stop`` is set; returns how many ran.
+
+    With ``once`` the loop exits as soon as no job is due instead of polling.
+    """
+    processed = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            # Take a host-wide OCR slot before claiming, so a job never sits
+            # leased while the CPU is busy with other OCR.
+            with ocr_slot(wait=settings.OCR_WORKER_POLL_INTERVAL) as admitted:
+                job = claim(worker_id) if admitted else None
+                if job is not None:
+                    run_job(job)
+                    processed += 1
+            if job is None:
+                if once and admitted:
+                    break
+                stop.wait(settings.OCR_WORKER_POLL_INTERVAL)
+    finally:
+        connection.close()
+    return processed
@@ -1,6 +1,12 @@
+import json
+import os
 import shutil
+import subprocess
+import sys
 import tempfile
-from io import BytesIO
+import unittest
+from datetime import timedelta
+from io import BytesIO, StringIO
 from pathlib import Path
 from unittest.mock import patch
 
@@ -8,9 +14,10 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from PIL import Image
 
-from .models import IDDocument, Voter
+from .models import IDDocument, ValidationJob, Voter
 
 
 class VoterPortalViewTests(TestCase):
@@ -107,6 +114,541 @@ class VoterPortalViewTests(TestCase):
         self.assertTrue((target_dir / "new_national_id.png").exists())
         self.assertTrue((target_dir / "new_voter_id.png").exists())
 
+    @override_settings(OCR_QUALITY_GATE=False, OCR_CACHE_ENABLED=False)
+    def test_upload_is_written_once_and_decoded_from_memory(self):
+        import cv2
+
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+        national_image = self._sample_image()
+        upload = national_image.read()
+        national_image.seek(0)
+        with patch("voters.services.ocr._get_reader", return_value=_FakeReader()), patch(
+            "cv2.imread", wraps=cv2.imread
+        ) as imread:
+            self.client.post(
+                reverse("voters:dashboard"),
+                {
+                    "national_id_image": national_image,
+                    "voter_card_image": self._sample_image(color=(0, 255, 0)),
+                },
+            )
+
+        self.assertEqual(imread.call_count, 0)
+        target_dir = Path(settings.MEDIA_ROOT) / "pull workers" / self.voter.voter_number
+        original = target_dir / "original_national_id.png"
+        processed = target_dir / "new_national_id.png"
+        # OCR replaced the processed file instead of writing through the link.
+        self.assertEqual(original.read_bytes(), upload)
+        self.assertFalse(processed.samefile(original))
+        self.assertEqual(sorted(path.suffix for path in target_dir.iterdir()), [".png"] * 4)
+
+    def test_upload_ocr_runs_outside_transaction_and_failure_is_recorded(self):
+        from django.db import connection
+
+        from voters.services.document_checks import DocumentProcessingError
+
+        depth_outside = len(connection.atomic_blocks)
+        depth_during_ocr = []
+        statuses_during_ocr = []
+
+        def _failing_ocr(documents, **kwargs):
+            depth_during_ocr.append(len(connection.atomic_blocks))
+            statuses_during_ocr.extend(
+                IDDocument.objects.values_list("validation_status", flat=True)
+            )
+            raise DocumentProcessingError("تعذر قراءة الصورة")
+
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+        with patch("voters.services.document_checks._run_ocr", side_effect=_failing_ocr):
+            response = self.client.post(
+                reverse("voters:dashboard"),
+                {
+                    "national_id_image": self._sample_image(),
+                    "voter_card_image": self._sample_image(color=(0, 255, 0)),
+                },
+                follow=True,
+            )
+
+        self.assertEqual(depth_during_ocr, [depth_outside])
+        # Already committed, so they must not look validated if OCR never returns.
+        self.assertEqual(statuses_during_ocr, ["pending", "pending"])
+        self.assertContains(response, "حدث خطأ أثناء تحليل الصور")
+        self.assertEqual(
+            list(IDDocument.objects.filter(voter=self.voter).values_list("validation_status", flat=True)),
+            ["failed", "failed"],
+        )
+
+    @override_settings(OCR_ASYNC_VALIDATION=True)
+    @patch("voters.views.process_document_pair")
+    def test_async_upload_queues_validation(self, mock_process_pair):
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+        response = self.client.post(
+            reverse("voters:dashboard"),
+            {
+                "national_id_image": self._sample_image(),
+                "voter_card_image": self._sample_image(color=(0, 255, 0)),
+            },
+            follow=True,
+        )
+
+        mock_process_pair.assert_not_called()
+        self.assertContains(response, "وجارٍ التحقق منهما")
+        job = ValidationJob.objects.get(voter=self.voter)
+        self.assertEqual(job.status, ValidationJob.Status.QUEUED)
+        self.assertEqual(
+            set(IDDocument.objects.filter(voter=self.voter).values_list("validation_status", flat=True)),
+            {"pending"},
+        )
+
+    @patch("voters.views.process_document_pair")
+    def test_upload_queued_when_ocr_slots_are_full(self, mock_process_pair):
+        from voters.services.ocr_admission import inflight, ocr_slot
+
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+        with override_settings(OCR_MAX_INFLIGHT=1, OCR_ADMISSION_DIR=Path(self.temp_media) / "slots"):
+            with ocr_slot() as admitted:
+                self.assertTrue(admitted)
+                self.assertEqual(inflight(), 1)
+                response = self.client.post(
+                    reverse("voters:dashboard"),
+                    {
+                        "national_id_image": self._sample_image(),
+                        "voter_card_image": self._sample_image(color=(0, 255, 0)),
+                    },
+                    follow=True,
+                )
+            self.assertEqual(inflight(), 0)
+
+        mock_process_pair.assert_not_called()
+        self.assertContains(response, "الترتيب 1")
+        self.assertEqual(ValidationJob.objects.get(voter=self.voter).status, "queued")
+
+    def test_admin_dashboard_shows_ocr_queue(self):
+        Voter.objects.create(voter_number="17157528", full_name="المسؤول")
+        national = IDDocument.objects.create(
+            voter=self.voter, document_type=IDDocument.DocumentType.NATIONAL_ID, image="n.png"
+        )
+        card = IDDocument.objects.create(
+            voter=self.voter, document_type=IDDocument.DocumentType.VOTER_CARD, image="c.png"
+        )
+        ValidationJob.objects.create(
+            voter=self.voter,
+            national_document=national,
+            voter_card_document=card,
+            run_after=timezone.now(),
+        )
+
+        self.client.post(reverse("voters:login"), {"voter_number": "17157528"})
+        response = self.client.get(reverse("voters:admin_dashboard"))
+
+        self.assertEqual(response.context["ocr_load"]["queued"], 1)
+        self.assertContains(response, "في قائمة انتظار التحقق")
+
+    def test_admin_dashboard_statuses_come_from_sql(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        Voter.objects.create(voter_number="17157528", full_name="المسؤول")
+        national, card = IDDocument.DocumentType.NATIONAL_ID, IDDocument.DocumentType.VOTER_CARD
+        uploads = {
+            "ب": [(national, "passed"), (card, "passed")],
+            "ج": [(national, "failed"), (national, "passed"), (card, "")],
+            "د": [(national, "passed")],
+            # Left blank by an upload interrupted before OCR finished.
+            "ه": [(national, "passed"), (card, "")],
+        }
+        for name, documents in uploads.items():
+            person = Voter.objects.create(voter_number=f"9{len(name)}{ord(name)}", full_name=name)
+            for document_type, status in documents:
+                IDDocument.objects.create(
+                    voter=person, document_type=document_type, image="x.png",
+                    validation_status=status,
+                )
+        IDDocument.objects.filter(voter__full_name="ج", validation_status="failed").update(
+            uploaded_at=timezone.now() - timedelta(days=1)
+        )
+
+        self.client.post(reverse("voters:login"), {"voter_number": "17157528"})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("voters:admin_dashboard"))
+
+        self.assertFalse(
+            [query for query in queries if query["sql"].startswith('SELECT "voters_iddocument"')]
+        )
+        self.assertEqual(
+            response.context["summary"],
+            {"total": 6, "with_uploads": 4, "completed": 1, "pending": 2, "failed": 1},
+        )
+        rows = {row["person"].full_name: row for row in response.context["rows"]}
+        self.assertEqual(rows["المسؤول"]["status_key"], "missing")
+        self.assertEqual(rows["ب"]["status_key"], "verified")
+        self.assertEqual(
+            (rows["ج"]["status_key"], rows["ج"]["national_status"], rows["ج"]["total_uploads"]),
+            ("failed", "passed", 3),
+        )
+        self.assertEqual(
+            (rows["د"]["status_label"], rows["د"]["has_voter_card"], rows["د"]["voter_status"]),
+            ("قيد المراجعة", False, ""),
+        )
+        self.assertEqual(rows["ه"]["status_key"], "pending")
+
+    def test_document_status_supports_conditional_get(self):
+        IDDocument.objects.create(
+            voter=self.voter,
+            document_type=IDDocument.DocumentType.NATIONAL_ID,
+            image="n.png",
+            validation_status="pending",
+        )
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+
+        response = self.client.get(reverse("voters:document_status"))
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertTrue(payload["pending"])
+        self.assertEqual(payload["documents"]["national_id"]["validation_status"], "pending")
+        self.assertIsNone(payload["documents"]["voter_card"])
+
+        etag = response["ETag"]
+        unchanged = self.client.get(reverse("voters:document_status"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+
+        IDDocument.objects.filter(voter=self.voter).update(validation_status="passed")
+        changed = self.client.get(reverse("voters:document_status"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertFalse(changed.json()["pending"])
+
+    def test_document_status_stream(self):
+        self.client.post(reverse("voters:login"), {"voter_number": "16737639"})
+        self.assertEqual(self.client.get(reverse("voters:document_status_stream")).status_code, 404)
+
+        with override_settings(STATUS_STREAM_ENABLED=True):
+            response = self.client.get(reverse("voters:document_status_stream"))
+            body = b"".join(response.streaming_content).decode("utf-8")
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(body.count("event: status"), 1)
+        self.assertIn('"pending": false', body)
+
+
+class ValidationQueueTests(TestCase):
+    def setUp(self):
+        from voters.services.validation_queue import enqueue_pair
+
+        voter = Voter.objects.create(voter_number="16750006", full_name="Queue Voter")
+        self.national = IDDocument.objects.create(
+            voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID, image="n.png"
+        )
+        self.card = IDDocument.objects.create(
+            voter=voter, document_type=IDDocument.DocumentType.VOTER_CARD, image="c.png"
+        )
+        self.job = enqueue_pair(self.national, self.card)
+
+    def test_worker_runs_job_once(self):
+        from voters.services.validation_queue import claim, run_job
+
+        job = claim("worker-a")
+        self.assertIsNone(claim("worker-b"))
+        with patch("voters.services.validation_queue.process_document_pair") as process_pair:
+            run_job(job)
+
+        process_pair.assert_called_once()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done")
+        self.assertEqual(self.job.attempts, 1)
+
+    @override_settings(OCR_WORKER_MAX_ATTEMPTS=2, OCR_WORKER_RETRY_DELAY=60)
+    def test_failures_back_off_then_fail_documents(self):
+        from voters.services.validation_queue import claim, run_job
+
+        with patch(
+            "voters.services.validation_queue.process_document_pair",
+            side_effect=RuntimeError("boom"),
+        ):
+            run_job(claim("worker-a"))
+            self.job.refresh_from_db()
+            self.assertEqual(self.job.status, "queued")
+            self.assertIsNone(claim("worker-a"))  # backing off
+
+            ValidationJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now())
+            run_job(claim("worker-a"))
+
+        self.job.refresh_from_db()
+        self.national.refresh_from_db()
+        self.assertEqual(self.job.status, "failed")
+        self.assertEqual(self.job.attempts, 2)
+        self.assertEqual(self.national.validation_status, "failed")
+        self.assertIn("boom", self.national.validation_errors)
+
+    def test_expired_lease_is_reclaimed(self):
+        from voters.services.validation_queue import claim
+
+        claim("crashed-worker")
+        self.assertIsNone(claim("worker-b"))
+        ValidationJob.objects.filter(pk=self.job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        job = claim("worker-b")
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertEqual(job.locked_by, "worker-b")
+        self.assertEqual(job.attempts, 2)
+
+
+class VoterImportTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+
+    def test_csv_reimport_skips_unchanged_rows(self):
+        from django.core.management import call_command
+
+        from voters.models import ImportManifest
+
+        Voter.objects.create(voter_number="100", full_name="قديم", email="a@example.com")
+        Voter.objects.create(voter_number="101", full_name="ثابت")
+        rows = [
+            "voter_number,full_name,email,birth_year",
+            "100,جديد,a@example.com,1980",
+            "101,ثابت,,",
+            "102,أول,,",
+            "102,ثاني,,1990",
+            "103,آخر,,",
+        ]
+        csv_path = Path(self.temp_dir) / "voters.csv"
+        csv_path.write_text("\n".join(rows), encoding="utf-8")
+
+        out = StringIO()
+        call_command("import_voters", str(csv_path), stdout=out)
+
+        self.assertIn("Created 2, updated 3", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        voters = {voter.voter_number: voter for voter in Voter.objects.all()}
+        self.assertEqual(voters["100"].full_name, "جديد")
+        self.assertEqual(voters["100"].birth_year, 1980)
+        self.assertEqual(voters["100"].email, "a@example.com")
+        self.assertEqual(voters["102"].full_name, "ثاني")
+        self.assertEqual(voters["102"].birth_year, 1990)
+        self.assertEqual(len(voters), 4)
+
+        # The next roll drops voter 102 and changes nothing else.
+        csv_path.write_text("\n".join(rows[:3] + rows[5:]), encoding="utf-8")
+        out = StringIO()
+        # Preload, one deactivation and the manifest: no row is rewritten.
+        with self.assertNumQueries(3):
+            call_command("import_voters", str(csv_path), "--deactivate-missing", stdout=out)
+
+        self.assertIn("Created 0, updated 0, unchanged 3, deactivated 1", out.getvalue())
+        self.assertFalse(Voter.objects.get(voter_number="102").is_active)
+        self.assertEqual(
+            Voter.objects.get(voter_number="100").updated_at, voters["100"].updated_at
+        )
+        manifest = ImportManifest.objects.latest("pk")
+        self.assertEqual((manifest.unchanged, manifest.deactivated), (3, 1))
+        self.assertEqual(ImportManifest.objects.count(), 2)
+
+    def test_repeated_row_counts_as_updated(self):
+        from voters.models import ImportManifest
+        from voters.services.importers import run_import
+
+        csv_path = Path(self.temp_dir) / "voters.csv"
+        csv_path.write_text("voter_number,full_name\n104,نفس\n104,نفس\n", encoding="utf-8")
+
+        result = run_import(ImportManifest.Kind.CSV, [(csv_path, None)])
+
+        self.assertEqual((result.created, result.updated, result.unchanged), (1, 1, 0))
+        self.assertEqual(Voter.objects.filter(voter_number="104").count(), 1)
+
+    def test_rejected_rows_are_not_deactivated(self):
+        from voters.models import ImportManifest
+        from voters.services.importers import run_import
+
+        Voter.objects.create(voter_number="2", full_name="B")
+        Voter.objects.create(voter_number="3", full_name="C")
+        csv_path = Path(self.temp_dir) / "voters.csv"
+        csv_path.write_text("voter_number,full_name,birth_year\n1,A,1980\n2,B,19x0\n", encoding="utf-8")
+
+        result = run_import(ImportManifest.Kind.CSV, [(csv_path, None)], deactivate_missing=True)
+
+        self.assertEqual((result.created, result.deactivated, len(result.errors)), (1, 1, 1))
+        self.assertTrue(Voter.objects.get(voter_number="2").is_active)
+        self.assertFalse(Voter.objects.get(voter_number="3").is_active)
+
+    def test_csv_import_resumes_from_checkpoint(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        from voters.models import ImportManifest
+        from voters.services.importers import VoterWriter
+
+        rows = ["voter_number,full_name,birth_year"]
+        rows += [f"{600 + index},ناخب {index},1980" for index in range(6)]
+        rows.insert(3, "699,خطأ,عام")
+        csv_path = Path(self.temp_dir) / "voters.csv"
+        csv_path.write_text("\n".join(rows), encoding="utf-8")
+        checkpoint = Path(self.temp_dir) / "import.json"
+        report = Path(self.temp_dir) / "errors.txt"
+        options = [
+            str(csv_path), "--batch-size", "3",
+            "--checkpoint", str(checkpoint), "--error-report", str(report),
+        ]
+
+        add = VoterWriter.add
+
+        def crash_on_603(writer, voter_number, values):
+            if voter_number == "603":
+                raise RuntimeError("connection lost")
+            add(writer, voter_number, values)
+
+        with patch.object(VoterWriter, "add", crash_on_603):
+            with self.assertRaises(RuntimeError):
+                call_command("import_voters", *options, stdout=StringIO())
+
+        # The first batch (two voters and the bad row) was committed and checkpointed.
+        self.assertEqual(Voter.objects.count(), 2)
+        self.assertEqual(json.loads(checkpoint.read_text())["offsets"], {"0": 3})
+
+        csv_path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+        with self.assertRaisesMessage(CommandError, "different input files"):
+            call_command("import_voters", *options, "--resume", stdout=StringIO())
+        csv_path.write_text("\n".join(rows), encoding="utf-8")
+
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_voters", *options, "--resume", "--deactivate-missing", stdout=out, stderr=err
+        )
+
+        self.assertIn("7/7 rows", out.getvalue())
+        self.assertIn("Created 6, updated 0, unchanged 0, deactivated 0", out.getvalue())
+        self.assertIn(f"Skipped 1 rows; see {report}", err.getvalue())
+        self.assertEqual(
+            report.read_text(encoding="utf-8"),
+            "Row 4: invalid birth year 'عام' for voter 699, skipped.\n",
+        )
+        self.assertEqual(Voter.objects.filter(is_active=True).count(), 6)
+        self.assertFalse(checkpoint.exists())
+        self.assertEqual(ImportManifest.objects.get().total_rows, 7)
+
+    def test_excel_import_writes_in_batches(self):
+        from openpyxl import Workbook
+
+        from voters.services.importers import import_voters_from_excel
+
+        Voter.objects.create(voter_number="200", full_name="قديم", is_active=False)
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["header"])
+        sheet.append(["ت", "الحزب", "رقم الناخب", "الاسم", "الأم", "المواليد", "المحافظة", "الصحيح"])
+        sheet.append([1, "حزب", 200, "اسم", "أم", 1970, "كركوك", None])
+        sheet.append([2, None, None, "بلا رقم", None, None, None, None])
+        for index in range(5):
+            sheet.append([3 + index, None, 300 + index, f"ناخب {index}", None, "x", None, None])
+        path = Path(self.temp_dir) / "voters.xlsx"
+        workbook.save(path)
+
+        result = import_voters_from_excel(path, batch_size=2)
+
+        self.assertEqual((result.created, result.updated, result.total_rows), (5, 1, 7))
+        self.assertEqual(len(result.errors), 6)
+        self.assertTrue(Voter.objects.get(voter_number="200").is_active)
+        self.assertEqual(Voter.objects.filter(voter_number__startswith="30").count(), 5)
+
+    def test_progress_total_for_sheet_without_dimensions(self):
+        import re
+        import zipfile
+
+        from openpyxl import Workbook, load_workbook
+
+        from voters.models import ImportManifest
+        from voters.services.importers import ImportResult, progress_line, run_import
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["header"])
+        sheet.append(["columns"])
+        for index in range(5):
+            sheet.append([index, None, 700 + index, f"ناخب {index}", None, 1980])
+        saved = Path(self.temp_dir) / "saved.xlsx"
+        workbook.save(saved)
+        # Rolls exported by other tools carry no <dimension>, so read-only
+        # openpyxl cannot tell their size.
+        path = Path(self.temp_dir) / "unsized.xlsx"
+        with zipfile.ZipFile(saved) as source, zipfile.ZipFile(path, "w") as target:
+            for item in source.infolist():
+                data = source.read(item)
+                if item.filename.startswith("xl/worksheets/"):
+                    data = re.sub(rb"<dimension [^>]*/>", b"", data)
+                target.writestr(item, data)
+
+        unsized = load_workbook(path, read_only=True)
+        self.assertIsNone(unsized.active.max_row)
+        unsized.close()
+
+        totals = []
+        run_import(
+            ImportManifest.Kind.EXCEL,
+            [(path, None)],
+            batch_size=2,
+            progress=lambda result, total: totals.append(total),
+        )
+
+        self.assertEqual(totals, [5, 5, 5])
+        self.assertEqual(Voter.objects.filter(voter_number__startswith="70").count(), 5)
+        self.assertEqual(
+            progress_line(ImportResult(total_rows=4, elapsed=2.0), None), "4 rows (2 rows/s)"
+        )
+        self.assertEqual(
+            progress_line(ImportResult(total_rows=4, elapsed=2.0), 6),
+            "4/6 rows (2 rows/s, ETA 0:00:01)",
+        )
+
+    def test_excel_sheets_parse_concurrently(self):
+        from openpyxl import Workbook
+
+        from voters.services.importers import import_voters_from_workbooks, sheet_names
+
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for offset, name in ((400, "كركوك"), (500, "نينوى")):
+            sheet = workbook.create_sheet(name)
+            sheet.append(["header"])
+            sheet.append(["columns"])
+            for index in range(50):
+                sheet.append([index, None, offset * 1000 + index, f"ناخب {index}", None, 1980])
+            sheet.append([50, None, None, "بلا رقم"])
+        path = Path(self.temp_dir) / "roll.xlsx"
+        workbook.save(path)
+
+        sources = [(path, name) for name in sheet_names(path)]
+        result = import_voters_from_workbooks(sources, batch_size=7, workers=2)
+
+        self.assertEqual((result.created, result.updated, result.total_rows), (100, 0, 102))
+        self.assertEqual(
+            sorted(result.errors),
+            [
+                "roll.xlsx [كركوك]: Row 53: missing voter number, skipped.",
+                "roll.xlsx [نينوى]: Row 53: missing voter number, skipped.",
+            ],
+        )
+        self.assertEqual(Voter.objects.filter(birth_year=1980).count(), 100)
+
+
+class StartupTests(TestCase):
+    def test_web_modules_do_not_import_ocr_stack(self):
+        # Guards process startup time: only running OCR may load these.
+        script = (
+            "import sys, django; django.setup(); import voters.views, voters.urls; "
+            "print(','.join(m for m in ('torch', 'easyocr', 'cv2') if m in sys.modules))"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "voter_portal.settings"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(completed.stdout.strip(), "")
+
 
 class DocumentCheckTests(TestCase):
     def test_validate_national_id_sets_birth_year_and_number(self):
@@ -120,3 +662,485 @@ class DocumentCheckTests(TestCase):
         self.assertEqual(errors, [])
         self.assertEqual(voter.birth_year, 2006)
         self.assertEqual(voter.national_id_number, "200661668131")
+
+    def test_pair_modes_produce_same_validation(self):
+        from django.core.files.base import ContentFile
+
+        from voters.services.document_checks import process_document_pair
+        from voters.services.ocr import OCRResult
+
+        def _fake_read(image_path, *, processed_path=None, data=None):
+            path = Path(image_path)
+            if path.stem.startswith("new_national_id"):
+                text = "الرقم الوطني 200661668131"
+            else:
+                text = f"رقم الناخب {path.parent.name}"
+            return OCRResult(None, 0, "probe", None, [], text=text)
+
+        temp_media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_media, ignore_errors=True)
+        outcomes = {}
+        with override_settings(MEDIA_ROOT=temp_media), patch(
+            "voters.services.ocr._read_document_local", side_effect=_fake_read
+        ):
+            for index, mode in enumerate(("serial", "threaded", "batched")):
+                voter = Voter.objects.create(
+                    voter_number=f"1675000{index}", full_name="اختبار"
+                )
+                docs = [
+                    IDDocument.objects.create(
+                        voter=voter,
+                        document_type=doc_type,
+                        image=ContentFile(f"{mode}-{doc_type}".encode(), name=f"{doc_type}.png"),
+                    )
+                    for doc_type in IDDocument.DocumentType.values
+                ]
+                with override_settings(OCR_PAIR_MODE=mode):
+                    process_document_pair(*docs)
+                outcomes[mode] = [
+                    (doc.validation_status, doc.validation_errors) for doc in docs
+                ]
+
+        self.assertEqual(outcomes["serial"], [("passed", ""), ("passed", "")])
+        self.assertEqual(docs[1].ocr_data["text"], "رقم الناخب 16750002")
+        self.assertEqual(docs[1].ocr_data["method"], "probe")
+        self.assertEqual(outcomes["threaded"], outcomes["serial"])
+        self.assertEqual(outcomes["batched"], outcomes["serial"])
+
+    def test_engine_cascade_escalates_only_failed_reads(self):
+        from django.core.files.base import ContentFile
+
+        from voters.services import ocr
+        from voters.services.document_checks import process_document
+
+        cheap = ocr.StubEngine(default="رقم الناخب 0")
+        full = ocr.StubEngine(default="")
+        cheap.name, full.name = "cheap", "full"
+        temp_media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_media, ignore_errors=True)
+        with override_settings(
+            MEDIA_ROOT=temp_media,
+            OCR_ENGINES={"voter_card": ["cheap", "full"]},
+            OCR_TARGETED_VERIFICATION=False,
+        ), patch.dict(ocr.ENGINES, {"cheap": cheap, "full": full}):
+            documents = []
+            for number in ("16750010", "16750011"):
+                voter = Voter.objects.create(voter_number=number, full_name="اختبار")
+                document = IDDocument.objects.create(
+                    voter=voter,
+                    document_type=IDDocument.DocumentType.VOTER_CARD,
+                    image=ContentFile(number.encode(), name="voter_card.png"),
+                )
+                documents.append(document)
+            cheap.texts[documents[0].image.path] = "رقم الناخب 16750010"
+            full.texts[documents[1].image.path] = "رقم الناخب 16750011"
+            for document in documents:
+                process_document(document)
+            misread_path = documents[1].image.path
+
+        self.assertEqual([doc.validation_status for doc in documents], ["passed", "passed"])
+        self.assertEqual(documents[1].ocr_data["text"], "رقم الناخب 16750011")
+        self.assertEqual(len(cheap.jobs), 2)
+        # Only the card the cheap engine misread went on to the full engine.
+        self.assertEqual([job.image_path for job in full.jobs], [misread_path])
+
+    @unittest.skipUnless(shutil.which("tesseract"), "tesseract is not installed")
+    def test_tesseract_engine_reads_digits(self):
+        from PIL import ImageDraw, ImageFont
+
+        from voters.services.ocr import OCRJob, get_engine
+
+        image = Image.new("RGB", (900, 200), color="white")
+        ImageDraw.Draw(image).text(
+            (40, 60), "200661668131", fill="black", font=ImageFont.load_default(size=72)
+        )
+        path = Path(tempfile.mkdtemp()) / "digits.png"
+        self.addCleanup(shutil.rmtree, path.parent, ignore_errors=True)
+        image.save(path)
+
+        result = get_engine("tesseract").read(OCRJob(str(path)))
+
+        self.assertEqual(result.engine, "tesseract")
+        self.assertIn("200661668131", result.text.replace(" ", ""))
+
+    def test_revalidate_documents_uses_stored_ocr_output(self):
+        from django.core.management import call_command
+
+        voter = Voter.objects.create(voter_number="16750006", full_name="اختبار")
+        stale = IDDocument.objects.create(
+            voter=voter,
+            document_type=IDDocument.DocumentType.VOTER_CARD,
+            image="c.png",
+            validation_status="failed",
+            validation_errors="old rule",
+            ocr_data={"text": "رقم الناخب ١٦٧٥٠٠٠٦", "boxes": [], "words": [], "conf": []},
+        )
+        never_read = IDDocument.objects.create(
+            voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID, image="n.png"
+        )
+
+        call_command("revalidate_documents", "--dry-run", stdout=StringIO())
+        stale.refresh_from_db()
+        self.assertEqual(stale.validation_status, "failed")
+
+        out = StringIO()
+        call_command("revalidate_documents", stdout=out)
+        stale.refresh_from_db()
+        never_read.refresh_from_db()
+        self.assertEqual(stale.validation_status, "passed")
+        self.assertEqual(stale.extracted_text, "رقم الناخب 16750006")
+        self.assertEqual(never_read.validation_status, "")
+        self.assertIn("failed -> passed: 1", out.getvalue())
+
+
+class _FakeReader:
+    """Stands in for easyocr.Reader: one wide box whose bright half must end up on the left."""
+
+    model_lang = "arabic"
+
+    def __init__(self):
+        self.calls = {"detect": 0, "recognize": 0}
+        self.detect_shapes = []
+
+    def detect(self, image, **kwargs):
+        self.calls["detect"] += 1
+        self.detect_shapes.append(image.shape[:2])
+        # The box sits at (40, 50)-(140, 70) of the 200px-wide card image.
+        factor = image.shape[1] / 200
+        return [[[int(v * factor) for v in (40, 140, 50, 70)]]], [[]]
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        self.calls["recognize"] += 1
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            crop = image[y_min:y_max, x_min:x_max]
+            half = crop.shape[1] // 2
+            upright = crop[:, :half].mean() > crop[:, half:].mean()
+            bbox = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+            results.append((bbox, "200661668131" if upright else "", 0.9 if upright else 0.1))
+        return results
+
+
+# The 200x120 synthetic card is far below the quality gate's minimum size.
+@override_settings(OCR_QUALITY_GATE=False)
+class OCROrientationTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_path = str(Path(self.temp_dir) / "card.png")
+        image = Image.new("RGB", (200, 120), color=(0, 0, 0))
+        image.paste((255, 255, 255), (40, 50, 90, 70))
+        image.save(self.image_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_probe_picks_orientation_without_exhaustive_search(self):
+        from voters.services.ocr import _auto_orient_and_crop
+
+        reader = _FakeReader()
+        cropped = _auto_orient_and_crop(self.image_path, reader).image
+
+        self.assertEqual(reader.calls["detect"], 1)
+        self.assertEqual(cropped.shape[:2], (60, 140))
+
+    def test_extract_text_reuses_orientation_pass(self):
+        from voters.services.ocr import extract_text
+
+        reader = _FakeReader()
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            text = extract_text(self.image_path)
+
+        self.assertEqual(text, "200661668131")
+        self.assertEqual(reader.calls["detect"], 1)
+
+    @override_settings(OCR_DETECTION_MAX_SIDE=100)
+    def test_detection_runs_downsampled(self):
+        from voters.services.ocr import _auto_orient_and_crop
+
+        reader = _FakeReader()
+        result = _auto_orient_and_crop(self.image_path, reader)
+
+        self.assertEqual(reader.detect_shapes, [(60, 100)])
+        self.assertEqual(result.crop_box, (20, 30, 160, 90))
+        self.assertEqual(result.results[0][1], "200661668131")
+
+    def test_repeat_upload_served_from_cache(self):
+        from voters.models import OCRCacheEntry
+        from voters.services.ocr import OCRJob, extract_text, read_documents
+
+        reader = _FakeReader()
+        processed_path = str(Path(self.temp_dir) / "processed.png")
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            first = extract_text(self.image_path)
+            second = extract_text(self.image_path, processed_path=processed_path)
+
+        self.assertEqual(first, second)
+        self.assertEqual(reader.calls["detect"], 1)
+        self.assertEqual(OCRCacheEntry.objects.get().hits, 1)
+        self.assertTrue(Path(processed_path).exists())
+
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            read_documents([OCRJob(self.image_path)], use_cache=False)
+        self.assertEqual(reader.calls["detect"], 2)
+        self.assertEqual(OCRCacheEntry.objects.get().hits, 1)
+
+    @override_settings(OCR_CACHE_ENABLED=False)
+    def test_targeted_read_stops_at_expected_number(self):
+        from voters.services.ocr import read_document
+
+        reader = _FakeReader()
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            found = read_document(self.image_path, expected_digits="200661668131")
+            missing = read_document(self.image_path, expected_digits="16737639")
+
+        self.assertEqual(found.mode, "targeted")
+        self.assertEqual(found.text, "200661668131")
+        self.assertEqual(missing.mode, "full")
+
+    @override_settings(OCR_QUANTIZE=False, OCR_TORCH_THREADS=2)
+    def test_reader_uses_precision_and_thread_settings(self):
+        from voters.services import ocr
+
+        ocr._get_reader.cache_clear()
+        self.addCleanup(ocr._get_reader.cache_clear)
+        with patch("easyocr.Reader") as reader_cls, patch(
+            "torch.set_num_threads"
+        ) as set_threads:
+            ocr._get_reader()
+
+        reader_cls.assert_called_once_with(["ar", "en"], gpu=False, quantize=False)
+        set_threads.assert_called_once_with(2)
+
+    def test_reader_loads_once_under_concurrent_first_use(self):
+        import threading
+        import time
+
+        from voters.services import ocr
+
+        ocr._get_reader.cache_clear()
+        self.addCleanup(ocr._get_reader.cache_clear)
+        loads = []
+
+        def slow_reader(*args, **kwargs):
+            loads.append(threading.get_ident())
+            time.sleep(0.1)
+            return _FakeReader()
+
+        with patch("easyocr.Reader", side_effect=slow_reader), patch("torch.set_num_threads"):
+            threads = [threading.Thread(target=ocr._get_reader) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(loads), 1)
+
+    def test_reprocess_documents_resumes_from_checkpoint(self):
+        from django.core.management import call_command
+
+        from voters.services.ocr import pipeline_version
+
+        voter = Voter.objects.create(voter_number="1", full_name="اختبار")
+        first, second = [
+            IDDocument.objects.create(
+                voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID, image="card.png"
+            )
+            for _ in range(2)
+        ]
+        checkpoint = Path(self.temp_dir) / "checkpoint.json"
+        checkpoint.write_text(
+            json.dumps({"pipeline": pipeline_version(), "last_pk": first.pk, "processed": 1})
+        )
+
+        out = StringIO()
+        with override_settings(MEDIA_ROOT=self.temp_dir), patch(
+            "voters.services.ocr._get_reader", return_value=_FakeReader()
+        ):
+            call_command(
+                "reprocess_documents", "--workers", "1", "--checkpoint", str(checkpoint), stdout=out
+            )
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.validation_status, "")
+        self.assertEqual(second.validation_status, "passed")
+        self.assertEqual(second.ocr_data["text"], "200661668131")
+        self.assertIn("Resuming after document", out.getvalue())
+        self.assertFalse(checkpoint.exists())
+
+    def test_reprocess_documents_retries_failed_documents(self):
+        from django.core.management import call_command
+
+        from voters.services.document_checks import read_and_confirm
+
+        voter = Voter.objects.create(voter_number="1", full_name="اختبار")
+        first, second = [
+            IDDocument.objects.create(
+                voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID, image="card.png"
+            )
+            for _ in range(2)
+        ]
+        checkpoint = Path(self.temp_dir) / "checkpoint.json"
+        options = ["--workers", "1", "--checkpoint", str(checkpoint)]
+
+        def fail_first(document, **kwargs):
+            # Reprocessing must read each image again, not serve the cache.
+            self.assertEqual(kwargs, {"use_cache": False})
+            if document.pk == first.pk:
+                raise RuntimeError("reader crashed")
+            return read_and_confirm(document, **kwargs)
+
+        with override_settings(MEDIA_ROOT=self.temp_dir), patch(
+            "voters.services.ocr._get_reader", return_value=_FakeReader()
+        ):
+            with patch(
+                "voters.management.commands.reprocess_documents.read_and_confirm", fail_first
+            ):
+                call_command("reprocess_documents", *options, stdout=StringIO(), stderr=StringIO())
+            self.assertEqual(json.loads(checkpoint.read_text())["failed"], [first.pk])
+
+            out = StringIO()
+            call_command("reprocess_documents", *options, stdout=out)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.validation_status, second.validation_status), ("passed", "passed"))
+        self.assertIn("1 to retry", out.getvalue())
+        self.assertIn("Re-processed 1 documents", out.getvalue())
+        self.assertFalse(checkpoint.exists())
+
+    @override_settings(OCR_QUALITY_GATE=True)
+    def test_quality_gate_rejects_before_any_inference(self):
+        from PIL import ImageDraw, ImageFilter
+
+        from voters.services.document_checks import assign_validation
+        from voters.services.ocr import OCRJob, assess_quality, run_job_locally
+
+        card = Image.new("RGB", (1000, 700), color=(70, 90, 110))
+        draw = ImageDraw.Draw(card)
+        draw.rectangle((150, 150, 850, 591), fill=(235, 235, 225))
+        for y in range(200, 560, 40):
+            draw.text((200, y), "200661668131", fill=(0, 0, 0))
+        sharp_path = str(Path(self.temp_dir) / "sharp.jpg")
+        blurred_path = str(Path(self.temp_dir) / "blurred.jpg")
+        card.save(sharp_path)
+        card.filter(ImageFilter.GaussianBlur(8)).save(blurred_path)
+
+        sharp = assess_quality(sharp_path)
+        self.assertEqual(sharp["problems"], [])
+        self.assertGreater(sharp["card_area"], 0.3)
+        self.assertIn("دقة الصورة منخفضة", assess_quality(self.image_path)["problems"][0])
+
+        reader = _FakeReader()
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            result = run_job_locally(OCRJob(blurred_path))
+        self.assertEqual(result.mode, "rejected")
+        self.assertEqual(reader.calls, {"detect": 0, "recognize": 0})
+
+        voter = Voter.objects.create(voter_number="1", full_name="اختبار")
+        document = assign_validation(
+            IDDocument(voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID), result
+        )
+        self.assertEqual(document.validation_status, "failed")
+        self.assertIn("الصورة غير واضحة", document.validation_errors)
+        self.assertLess(document.quality_metrics["sharpness"], 15)
+
+    @override_settings(OCR_FIELD_LOCALIZATION=True)
+    def test_field_localization_reads_only_the_number_field(self):
+        from PIL import ImageDraw
+
+        from voters.services.document_checks import assign_validation
+        from voters.services.ocr import OCRJob, run_job_locally
+
+        class _FieldReader:
+            model_lang = "arabic"
+
+            def __init__(self):
+                self.boxes = []
+
+            def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+                x_min, x_max, y_min, y_max = horizontal_list[0]
+                self.boxes.append(horizontal_list[0])
+                # Digits are printed in the dark band at the card's top left.
+                inked = image[y_min:y_max, x_min:x_max].mean() < 128
+                bbox = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+                return [(bbox, "٢٠٠٦٦١٦٦٨١٣١" if inked else "", 0.9 if inked else 0.1)]
+
+        photo = Image.new("RGB", (1000, 700), color=(70, 90, 110))
+        draw = ImageDraw.Draw(photo)
+        draw.rectangle((150, 150, 850, 591), fill=(235, 235, 225))
+        draw.rectangle((185, 190, 570, 250), fill=(20, 20, 20))
+        path = str(Path(self.temp_dir) / "photo.png")
+        photo.save(path)
+
+        reader = _FieldReader()
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            result = run_job_locally(OCRJob(path, document_type="national_id"))
+
+        self.assertEqual(result.mode, "fields")
+        self.assertEqual(result.angle, 0)
+        self.assertEqual(result.fields["number"], "200661668131")
+        # Two fields read at two candidate half-turns, nothing else.
+        self.assertEqual(len(reader.boxes), 4)
+
+        voter = Voter.objects.create(voter_number="1", full_name="اختبار")
+        document = assign_validation(
+            IDDocument(voter=voter, document_type=IDDocument.DocumentType.NATIONAL_ID), result
+        )
+        self.assertEqual(document.validation_status, "passed")
+        self.assertEqual(voter.birth_year, 2006)
+
+    def test_warm_up_loads_reader_and_runs_a_pass(self):
+        from voters.services.ocr import warm_up
+
+        reader = _FakeReader()
+        with patch("voters.services.ocr._get_reader", return_value=reader):
+            warm_up()
+
+        self.assertEqual(reader.detect_shapes, [(64, 64)])
+
+    def test_extract_text_through_ocr_server(self):
+        import threading
+
+        from voters.services.ocr import extract_text
+        from voters.services.ocr_server import OCRServer
+
+        socket_path = str(Path(self.temp_dir) / "ocr.sock")
+        server = OCRServer(socket_path, workers=1)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with patch("voters.services.ocr._get_reader", return_value=_FakeReader()):
+                with override_settings(OCR_SERVER_SOCKET=socket_path):
+                    text = extract_text(self.image_path)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(text, "200661668131")
+
+    def test_onnx_recognizer_matches_torch(self):
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            self.skipTest("onnxruntime is not installed")
+        import torch
+        from easyocr.config import recognition_models
+        from easyocr.model.model import Model
+
+        from voters.services.ocr_onnx import OnnxRecognizer, _export_recognizer
+
+        # The Arabic reader is a generation-1 model: ResNet features, not VGG.
+        self.assertIn("arabic_g1", recognition_models["gen1"])
+        torch.manual_seed(0)
+        model = Model(input_channel=1, output_channel=64, hidden_size=32, num_class=12).eval()
+        path = Path(self.temp_dir) / "recognizer.onnx"
+        with torch.no_grad():
+            _export_recognizer(model, path)
+
+        image = torch.randn(2, 1, 64, 200)
+        with torch.no_grad():
+            expected = model(image, None)
+        preds = OnnxRecognizer(path).eval()(image, None)
+        self.assertEqual(preds.shape, expected.shape)
+        self.assertTrue(torch.allclose(preds, expected, atol=1e-4))
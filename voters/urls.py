@@ -7,6 +7,8 @@ app_name = "voters"
 urlpatterns = [
     path("", views.login_view, name="login"),
     path("dashboard/", views.dashboard, name="dashboard"),
+    path("dashboard/status/", views.document_status, name="document_status"),
+    path("dashboard/status/stream/", views.document_status_stream, name="document_status_stream"),
     path("logout/", views.logout_view, name="logout"),
     path("admin-dashboard/", views.admin_dashboard, name="admin_dashboard"),
 ]
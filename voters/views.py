@@ -1,23 +1,40 @@
+import hashlib
+import json
 import os
+import time
 from functools import wraps
 
+from django.conf import settings
 from django.contrib import messages
-from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Case, Count, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from .forms import IDUploadForm, LoginForm
 from .models import IDDocument, Voter
 from .services.document_checks import (
     DocumentProcessingError,
+    mark_documents_failed,
     process_document_pair,
 )
+from .services.ocr_admission import ocr_slot, queue_position
+from .services.ocr_admission import stats as admission_stats
+from .services.uploads import save_upload
+from .services.validation_queue import enqueue_pair
 
 SESSION_KEY = "voter_id"
 ADMIN_VOTER_NUMBER = os.environ.get("ADMIN_VOTER_NUMBER", "17157528")
+DASHBOARD_STATUS_LABELS = {
+    "missing": "لم يتم الرفع",
+    "verified": "مكتمل",
+    "failed": "فشل التحقق",
+    "pending": "قيد المراجعة",
+}
 
 
 def get_logged_in_voter(request):
@@ -87,11 +104,7 @@ def dashboard(request):
             voter_card_image = form.cleaned_data["voter_card_image"]
 
             def _prepare_document(uploaded_file, doc_type):
-                uploaded_file.seek(0)
-                data = uploaded_file.read()
-                uploaded_file.seek(0)
-
-                if not data:
+                if not uploaded_file.size:
                     raise DocumentProcessingError("الملف المرفوع فارغ.")
 
                 ext = os.path.splitext(uploaded_file.name or "")[1].lower() or ".jpg"
@@ -102,27 +115,30 @@ def dashboard(request):
                     else "voter_id"
                 )
 
-                original_rel = f"{folder}/original_{base_name}{ext}"
                 processed_rel = f"{folder}/new_{base_name}{ext}"
+                # One write of the upload; the processed file starts as a link
+                # to it and OCR replaces it with the rotated/cropped image.
+                data = save_upload(
+                    uploaded_file, f"{folder}/original_{base_name}{ext}", processed_rel
+                )
 
-                for rel_path in (original_rel, processed_rel):
-                    if default_storage.exists(rel_path):
-                        default_storage.delete(rel_path)
-
-                default_storage.save(original_rel, ContentFile(data))
-
-                processed_content = ContentFile(data)
-                processed_content.name = f"new_{base_name}{ext}"
-
+                # Pending until OCR records a result, so a request killed
+                # mid-OCR never leaves the document looking validated.
                 document = IDDocument.objects.create(
                     voter=voter,
                     document_type=doc_type,
-                    image=processed_content,
+                    image=processed_rel,
+                    validation_status="pending",
                 )
+                # Lets OCR decode the bytes already in memory instead of
+                # reading the file back.
+                document.upload_data = data
 
                 return document
 
             try:
+                # Short transaction: only the document rows (and the queue
+                # entry) are written here; OCR runs after it commits.
                 with transaction.atomic():
                     national_doc = _prepare_document(
                         national_image, IDDocument.DocumentType.NATIONAL_ID
@@ -130,7 +146,8 @@ def dashboard(request):
                     voter_doc = _prepare_document(
                         voter_card_image, IDDocument.DocumentType.VOTER_CARD
                     )
-                    process_document_pair(national_doc, voter_doc)
+                    if settings.OCR_ASYNC_VALIDATION:
+                        enqueue_pair(national_doc, voter_doc)
             except DocumentProcessingError as exc:
                 messages.error(request, f"حدث خطأ أثناء تحليل الصور: {exc}")
                 return redirect("voters:dashboard")
@@ -140,6 +157,40 @@ def dashboard(request):
                 )
                 return redirect("voters:dashboard")
 
+            if not settings.OCR_ASYNC_VALIDATION:
+                try:
+                    with ocr_slot() as admitted:
+                        if admitted:
+                            process_document_pair(national_doc, voter_doc)
+                except DocumentProcessingError as exc:
+                    mark_documents_failed([national_doc, voter_doc], str(exc))
+                    messages.error(request, f"حدث خطأ أثناء تحليل الصور: {exc}")
+                    return redirect("voters:dashboard")
+                except Exception as exc:  # pragma: no cover - defensive
+                    mark_documents_failed([national_doc, voter_doc], str(exc))
+                    messages.error(
+                        request, f"حدث خطأ غير متوقع أثناء رفع الصور: {exc}"
+                    )
+                    return redirect("voters:dashboard")
+
+                if not admitted:
+                    # Every OCR slot on this host is busy: queue the pair for
+                    # run_ocr_worker instead of adding to the CPU contention.
+                    job = enqueue_pair(national_doc, voter_doc)
+                    messages.info(
+                        request,
+                        "الخادم مشغول حاليًا، وتمت إضافة وثائقك إلى قائمة الانتظار "
+                        f"(الترتيب {queue_position(job)}). ستظهر النتيجة في سجل التحقق.",
+                    )
+                    return redirect("voters:dashboard")
+
+            if settings.OCR_ASYNC_VALIDATION:
+                messages.success(
+                    request,
+                    "تم رفع الصورتين بنجاح، وجارٍ التحقق منهما آليًا. ستظهر النتيجة في سجل التحقق.",
+                )
+                return redirect("voters:dashboard")
+
             failed_docs = [
                 doc
                 for doc in (national_doc, voter_doc)
@@ -179,10 +230,79 @@ def dashboard(request):
         "national_docs": national_docs,
         "voter_card_docs": voter_card_docs,
         "is_admin": voter.voter_number == ADMIN_VOTER_NUMBER,
+        "has_pending": any(
+            doc.validation_status == "pending"
+            for doc in (national_docs.first(), voter_card_docs.first())
+            if doc
+        ),
+        "status_poll_interval": settings.STATUS_POLL_INTERVAL,
+        "status_stream_enabled": settings.STATUS_STREAM_ENABLED,
     }
     return render(request, "voters/dashboard.html", context)
 
 
+def _latest_document_status(voter):
+    """Status of the voter's latest document of each type, and its ETag."""
+    documents = {}
+    for doc_type in IDDocument.DocumentType.values:
+        documents[doc_type] = (
+            voter.documents.filter(document_type=doc_type)
+            .order_by("-uploaded_at", "-pk")
+            .values("id", "validation_status", "validation_errors")
+            .first()
+        )
+    payload = {
+        "documents": documents,
+        "pending": any(
+            doc and doc["validation_status"] == "pending" for doc in documents.values()
+        ),
+    }
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return payload, quote_etag(hashlib.sha256(body.encode("utf-8")).hexdigest()[:32])
+
+
+@voter_login_required
+def document_status(request):
+    """Lightweight JSON status for the dashboard to poll; supports If-None-Match."""
+    payload, etag = _latest_document_status(request.voter)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(payload, json_dumps_params={"ensure_ascii": False})
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@voter_login_required
+def document_status_stream(request):
+    """Server-sent events version of ``document_status`` (STATUS_STREAM_ENABLED).
+
+    Pushes an event whenever the status changes and closes once nothing is
+    pending or after STATUS_STREAM_MAX_SECONDS; EventSource reconnects.
+    """
+    if not settings.STATUS_STREAM_ENABLED:
+        raise Http404
+    voter = request.voter
+
+    def _events():
+        deadline = time.monotonic() + settings.STATUS_STREAM_MAX_SECONDS
+        last_etag = None
+        while True:
+            payload, etag = _latest_document_status(voter)
+            if etag != last_etag:
+                last_etag = etag
+                data = json.dumps(payload, ensure_ascii=False)
+                yield f"id: {etag}\nevent: status\ndata: {data}\n\n"
+            if not payload["pending"] or time.monotonic() >= deadline:
+                return
+            time.sleep(settings.STATUS_STREAM_INTERVAL)
+
+    response = StreamingHttpResponse(_events(), content_type="text/event-stream")
+    response["X-Accel-Buffering"] = "no"
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 def logout_view(request):
     request.session.pop(SESSION_KEY, None)
     messages.info(request, "تم تسجيل الخروج بنجاح.")
@@ -196,72 +316,73 @@ def admin_dashboard(request):
         messages.error(request, "لا تملك صلاحية الوصول إلى لوحة الإدارة.")
         return redirect("voters:dashboard")
 
-    voters_qs = (
-        Voter.objects.prefetch_related("documents")
-        .annotate(total_uploads=Count("documents"))
-        .order_by("full_name")
+    def latest_status(document_type):
+        return Coalesce(
+            Subquery(
+                IDDocument.objects.filter(voter=OuterRef("pk"), document_type=document_type)
+                .order_by("-uploaded_at")
+                .values("validation_status")[:1]
+            ),
+            Value(""),
+        )
+
+    # Every status is worked out in SQL; no document row is loaded.
+    voters_qs = Voter.objects.annotate(
+        total_uploads=Count("documents"),
+        national_uploads=Count(
+            "documents", filter=Q(documents__document_type=IDDocument.DocumentType.NATIONAL_ID)
+        ),
+        voter_card_uploads=Count(
+            "documents", filter=Q(documents__document_type=IDDocument.DocumentType.VOTER_CARD)
+        ),
+        unpassed_uploads=Count("documents", filter=~Q(documents__validation_status="passed")),
+        failed_uploads=Count("documents", filter=Q(documents__validation_status="failed")),
+        latest_upload=Max("documents__uploaded_at"),
+    ).annotate(
+        status_key=Case(
+            When(total_uploads=0, then=Value("missing")),
+            When(
+                national_uploads__gt=0,
+                voter_card_uploads__gt=0,
+                unpassed_uploads=0,
+                then=Value("verified"),
+            ),
+            When(failed_uploads__gt=0, then=Value("failed")),
+            default=Value("pending"),
+        ),
     )
 
-    rows = []
-    summary = {
-        "total": voters_qs.count(),
-        "with_uploads": 0,
-        "completed": 0,
-        "pending": 0,
-        "failed": 0,
-    }
+    summary = voters_qs.aggregate(
+        total=Count("pk"),
+        with_uploads=Count("pk", filter=Q(total_uploads__gt=0)),
+        completed=Count("pk", filter=Q(status_key="verified")),
+        pending=Count("pk", filter=Q(status_key="pending")),
+        failed=Count("pk", filter=Q(status_key="failed")),
+    )
 
-    for person in voters_qs:
-        docs = list(person.documents.all())
-        national_docs = [doc for doc in docs if doc.document_type == IDDocument.DocumentType.NATIONAL_ID]
-        voter_docs = [doc for doc in docs if doc.document_type == IDDocument.DocumentType.VOTER_CARD]
-
-        latest_upload = max((doc.uploaded_at for doc in docs if doc.uploaded_at), default=None)
-        total_uploads = len(docs)
-        has_both = bool(national_docs) and bool(voter_docs)
-        passed_all = (
-            has_both
-            and all(doc.validation_status == "passed" for doc in national_docs + voter_docs if doc.validation_status)
-        )
-        any_failed = any(doc.validation_status == "failed" for doc in docs)
-
-        if total_uploads == 0:
-            status_key = "missing"
-            status_label = "لم يتم الرفع"
-        elif passed_all:
-            status_key = "verified"
-            status_label = "مكتمل"
-        elif any_failed:
-            status_key = "failed"
-            status_label = "فشل التحقق"
-        else:
-            status_key = "pending"
-            status_label = "قيد المراجعة"
-
-        summary["with_uploads"] += int(total_uploads > 0)
-        if status_key == "verified":
-            summary["completed"] += 1
-        elif status_key == "failed":
-            summary["failed"] += 1
-        elif status_key in {"pending"}:
-            summary["pending"] += 1
-
-        rows.append(
-            {
-                "person": person,
-                "total_uploads": total_uploads,
-                "has_national": bool(national_docs),
-                "has_voter_card": bool(voter_docs),
-                "latest_upload": latest_upload,
-                "status_key": status_key,
-                "status_label": status_label,
-                "national_status": national_docs[0].validation_status if national_docs else "",
-                "voter_status": voter_docs[0].validation_status if voter_docs else "",
-            }
+    rows = [
+        {
+            "person": person,
+            "total_uploads": person.total_uploads,
+            "has_national": person.national_uploads > 0,
+            "has_voter_card": person.voter_card_uploads > 0,
+            "latest_upload": person.latest_upload,
+            "status_key": person.status_key,
+            "status_label": DASHBOARD_STATUS_LABELS[person.status_key],
+            "national_status": person.national_status,
+            "voter_status": person.voter_status,
+        }
+        for person in voters_qs.annotate(
+            national_status=latest_status(IDDocument.DocumentType.NATIONAL_ID),
+            voter_status=latest_status(IDDocument.DocumentType.VOTER_CARD),
         )
+        .only("full_name", "voter_number", "birth_year", "national_id_number")
+        .order_by("full_name")
+    ]
 
     context = {
         "summary": summary,
+        "ocr_load": admission_stats(),
         "rows": rows,
         "admin_voter": voter,
     }